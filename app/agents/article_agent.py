@@ -1,20 +1,104 @@
 import os
-from typing import Dict
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, APITimeoutError, RateLimitError
 from loguru import logger
 
+from app.core.adaptive_limiter import ProviderOverloaded, provider_call
+from app.core.cache import (
+    CACHE_OFF,
+    CACHE_REFRESH,
+    CACHE_REUSE,
+    TieredCache,
+    make_cache_key,
+    normalize_prompt,
+)
+
+
+# =========================
+# Конфигурация
+# =========================
+
+ARTICLE_TIMEOUT = float(os.getenv("ARTICLE_TIMEOUT", "120"))          # секунды на completion
+ARTICLE_MAX_RETRIES = int(os.getenv("ARTICLE_MAX_RETRIES", "2"))      # ретраи внутри SDK
+ARTICLE_CONCURRENCY = int(os.getenv("ARTICLE_CONCURRENCY", "8"))      # жёсткий потолок на процесс
+ARTICLE_MAX_CONNECTIONS = int(os.getenv("ARTICLE_MAX_CONNECTIONS", "20"))
+ARTICLE_KEEPALIVE_SECONDS = float(os.getenv("ARTICLE_KEEPALIVE_SECONDS", "60"))
+
+ARTICLE_TEMPERATURE = 0.7
+ARTICLE_MAX_TOKENS = 1200
+
+# Кэш генерации: одинаковый промт + параметры модели -> готовая статья.
+# reuse — отдать из кэша, refresh — сгенерировать заново и перезаписать, off — без кэша
+ARTICLE_CACHE_MODE = os.getenv("ARTICLE_CACHE_MODE", os.getenv("GENERATION_CACHE_MODE", CACHE_REUSE))
+ARTICLE_CACHE_TTL = int(os.getenv("ARTICLE_CACHE_TTL", "604800"))                # секунды
+ARTICLE_CACHE_MAX_ITEMS = int(os.getenv("ARTICLE_CACHE_MAX_ITEMS", "500"))       # в памяти процесса
+ARTICLE_CACHE_REDIS_MAX_ITEMS = int(os.getenv("ARTICLE_CACHE_REDIS_MAX_ITEMS", "20000"))
+
+_article_cache = TieredCache(
+    namespace="article",
+    max_items=ARTICLE_CACHE_MAX_ITEMS,
+    ttl=ARTICLE_CACHE_TTL,
+    redis_max_items=ARTICLE_CACHE_REDIS_MAX_ITEMS,
+)
+
 
 # =========================
 # Инициализация клиента
 # =========================
 
-def _get_openai_client() -> OpenAI:
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY not set in environment")
+_client: Optional[AsyncOpenAI] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_openai_client() -> AsyncOpenAI:
+    """
+    Один AsyncOpenAI на процесс: пул httpx держит TLS-соединения
+    открытыми между вызовами, вместо нового клиента на каждую статью.
+    """
+
+    global _client
+
+    if _client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise RuntimeError("OPENAI_API_KEY not set in environment")
+
+        _client = AsyncOpenAI(
+            api_key=api_key,
+            timeout=ARTICLE_TIMEOUT,
+            max_retries=ARTICLE_MAX_RETRIES,
+            http_client=httpx.AsyncClient(
+                timeout=ARTICLE_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=ARTICLE_MAX_CONNECTIONS,
+                    max_keepalive_connections=ARTICLE_MAX_CONNECTIONS,
+                    keepalive_expiry=ARTICLE_KEEPALIVE_SECONDS,
+                ),
+            ),
+        )
+
+    return _client
 
-    return OpenAI(api_key=api_key)
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(ARTICLE_CONCURRENCY)
+    return _semaphore
+
+
+async def close_openai_client() -> None:
+    """
+    Закрывает пул соединений (при остановке процесса).
+    """
+
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
 
 
 # =========================
@@ -58,20 +142,44 @@ def _build_article_prompt(
 """.strip()
 
 
+def _build_messages(prompt: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": "Ты профессиональный редактор и автор статей."},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def _article_cache_key(prompt: str, model: str) -> str:
+    return make_cache_key(
+        normalize_prompt(prompt), model, ARTICLE_TEMPERATURE, ARTICLE_MAX_TOKENS
+    )
+
+
+def article_cache_stats() -> Dict[str, Any]:
+    """
+    Счётчики попаданий / промахов кэша генерации статей.
+    """
+    return _article_cache.stats()
+
+
 # =========================
 # Основная функция агента
 # =========================
 
-def generate_article(
+async def generate_article(
     title: str,
     description: str,
     style: str = "информативный",
     platform: str = "telegram",
     length: str = "medium",
-    model: str = "gpt-4.1"
+    model: str = "gpt-4.1",
+    cache_mode: Optional[str] = None,
 ) -> Dict[str, str]:
     """
-    Генерирует статью по заданным параметрам
+    Генерирует статью по заданным параметрам (асинхронно, через общий клиент)
+
+    cache_mode (по умолчанию ARTICLE_CACHE_MODE): reuse | refresh | off.
+    Одновременные запросы с одинаковым промтом выполняются одним вызовом модели.
 
     Возвращает:
     {
@@ -81,10 +189,6 @@ def generate_article(
     }
     """
 
-    logger.info(f"[ArticleAgent] Generating article: {title}")
-
-    client = _get_openai_client()
-
     prompt = _build_article_prompt(
         title=title,
         description=description,
@@ -93,16 +197,40 @@ def generate_article(
         length=length
     )
 
+    mode = cache_mode or ARTICLE_CACHE_MODE
+    if mode == CACHE_OFF:
+        return await _generate_article(title, prompt, model)
+
+    key = _article_cache_key(prompt, model)
+    if mode == CACHE_REFRESH:
+        await _article_cache.delete(key)
+
+    article = await _article_cache.get_or_compute(
+        key,
+        lambda: _generate_article(title, prompt, model),
+        should_cache=lambda result: bool(result.get("text")),
+    )
+    return {**article, "title": title}
+
+
+async def _generate_article(title: str, prompt: str, model: str) -> Dict[str, str]:
+    logger.info(f"[ArticleAgent] Generating article: {title}")
+
+    client = _get_openai_client()
+
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "Ты профессиональный редактор и автор статей."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=1200,
-        )
+        async with _get_semaphore(), provider_call("openai", "chat"):
+            try:
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=_build_messages(prompt),
+                    temperature=ARTICLE_TEMPERATURE,
+                    max_tokens=ARTICLE_MAX_TOKENS,
+                )
+            except RateLimitError as e:
+                raise ProviderOverloaded(f"OpenAI rate limit: {e}") from e
+            except APITimeoutError as e:
+                raise asyncio.TimeoutError(f"OpenAI request timed out: {e}") from e
 
         article_text = response.choices[0].message.content.strip()
 
@@ -117,3 +245,79 @@ def generate_article(
     except Exception as e:
         logger.error(f"[ArticleAgent] Error generating article: {e}")
         raise
+
+
+# =========================
+# Потоковая генерация
+# =========================
+
+async def generate_article_stream(
+    title: str,
+    description: str,
+    style: str = "информативный",
+    platform: str = "telegram",
+    length: str = "medium",
+    model: str = "gpt-4.1",
+    cache_mode: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    Генерирует статью потоком: отдаёт фрагменты текста по мере прихода токенов.
+
+    Если потребитель прекращает итерацию (aclose / break), HTTP-поток
+    закрывается сразу — генерация на стороне OpenAI обрывается.
+
+    Кэш общий с generate_article: при попадании (reuse) статья отдаётся
+    одним фрагментом; в кэш попадает только дочитанный до конца поток.
+    """
+
+    prompt = _build_article_prompt(
+        title=title,
+        description=description,
+        style=style,
+        platform=platform,
+        length=length
+    )
+
+    mode = cache_mode or ARTICLE_CACHE_MODE
+    key = _article_cache_key(prompt, model)
+
+    if mode == CACHE_REUSE:
+        cached = await _article_cache.get(key)
+        if cached is not None and cached.get("text"):
+            logger.info(f"[ArticleAgent] Article cache hit: {title}")
+            yield cached["text"]
+            return
+
+    logger.info(f"[ArticleAgent] Streaming article: {title}")
+
+    client = _get_openai_client()
+    parts: List[str] = []
+
+    async with _get_semaphore(), provider_call("openai", "chat"):
+        try:
+            stream = await client.chat.completions.create(
+                model=model,
+                messages=_build_messages(prompt),
+                temperature=ARTICLE_TEMPERATURE,
+                max_tokens=ARTICLE_MAX_TOKENS,
+                stream=True,
+            )
+        except RateLimitError as e:
+            raise ProviderOverloaded(f"OpenAI rate limit: {e}") from e
+        except APITimeoutError as e:
+            raise asyncio.TimeoutError(f"OpenAI request timed out: {e}") from e
+
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        finally:
+            await stream.response.aclose()
+
+    text = "".join(parts).strip()
+    if text and mode != CACHE_OFF:
+        await _article_cache.set(key, {"title": title, "text": text, "model": model})
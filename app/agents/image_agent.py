@@ -1,10 +1,25 @@
 import os
 import json
+import asyncio
 import hashlib
-from typing import List
+import logging
+from typing import Any, Dict, List, Optional
 
 import aiohttp
 
+from app.core.adaptive_limiter import ProviderOverloaded, provider_call
+from app.core.http_client import get_http_session
+from app.core.cache import (
+    CACHE_OFF,
+    CACHE_REFRESH,
+    TieredCache,
+    make_cache_key,
+    normalize_prompt,
+)
+
+
+logger = logging.getLogger(__name__)
+
 
 # =========================
 # Конфигурация
@@ -17,6 +32,24 @@ OPENAI_IMAGE_MODEL = os.getenv("OPENAI_IMAGE_MODEL", "gpt-image-1")
 IMAGE_SIZE = os.getenv("IMAGE_SIZE", "1024x1024")
 IMAGE_QUALITY = os.getenv("IMAGE_QUALITY", "standard")
 
+# Каждое изображение — отдельный запрос со своим дедлайном
+IMAGE_TIMEOUT = float(os.getenv("IMAGE_TIMEOUT", "90"))             # секунды на одно изображение
+IMAGE_RETRY_ROUNDS = int(os.getenv("IMAGE_RETRY_ROUNDS", "1"))      # повторы только недостающих
+
+# Кэш генерации: одинаковый промт + модель/размер/качество/количество -> готовые URL.
+# TTL меньше часа: ссылки OpenAI Images живут около 60 минут
+IMAGE_CACHE_MODE = os.getenv("IMAGE_CACHE_MODE", os.getenv("GENERATION_CACHE_MODE", "reuse"))
+IMAGE_CACHE_TTL = int(os.getenv("IMAGE_CACHE_TTL", "3000"))               # секунды
+IMAGE_CACHE_MAX_ITEMS = int(os.getenv("IMAGE_CACHE_MAX_ITEMS", "500"))    # в памяти процесса
+IMAGE_CACHE_REDIS_MAX_ITEMS = int(os.getenv("IMAGE_CACHE_REDIS_MAX_ITEMS", "5000"))
+
+_image_cache = TieredCache(
+    namespace="image",
+    max_items=IMAGE_CACHE_MAX_ITEMS,
+    ttl=IMAGE_CACHE_TTL,
+    redis_max_items=IMAGE_CACHE_REDIS_MAX_ITEMS,
+)
+
 
 # =========================
 # Публичный интерфейс агента
@@ -27,12 +60,16 @@ async def generate_images(
     article_text: str,
     style: str,
     count: int = 1,
+    cache_mode: Optional[str] = None,
 ) -> List[str]:
     """
     Генерирует изображения под статью.
 
+    cache_mode (по умолчанию IMAGE_CACHE_MODE): reuse | refresh | off.
+    В кэш попадает только полный набор из count изображений.
+
     Возвращает:
-    - список URL изображений
+    - список URL изображений (может быть короче count — часть запросов не удалась)
     - либо пустой список (если провайдер вернул ошибку)
 
     Исключения:
@@ -45,13 +82,35 @@ async def generate_images(
         style=style,
     )
 
-    if IMAGE_PROVIDER == "openai":
-        return await _generate_openai(prompt, count)
-
     if IMAGE_PROVIDER == "stub":
         return _generate_stub(prompt, count)
 
-    raise ValueError(f"Unsupported IMAGE_PROVIDER: {IMAGE_PROVIDER}")
+    if IMAGE_PROVIDER != "openai":
+        raise ValueError(f"Unsupported IMAGE_PROVIDER: {IMAGE_PROVIDER}")
+
+    mode = cache_mode or IMAGE_CACHE_MODE
+    if mode == CACHE_OFF:
+        return await _generate_openai(prompt, count)
+
+    key = make_cache_key(
+        normalize_prompt(prompt), OPENAI_IMAGE_MODEL, IMAGE_SIZE, IMAGE_QUALITY, count
+    )
+    if mode == CACHE_REFRESH:
+        await _image_cache.delete(key)
+
+    images = await _image_cache.get_or_compute(
+        key,
+        lambda: _generate_openai(prompt, count),
+        should_cache=lambda result: len(result) == count,
+    )
+    return list(images)
+
+
+def image_cache_stats() -> Dict[str, Any]:
+    """
+    Счётчики попаданий / промахов кэша генерации изображений.
+    """
+    return _image_cache.stats()
 
 
 # =========================
@@ -84,11 +143,52 @@ def _build_prompt(title: str, article_text: str, style: str) -> str:
 async def _generate_openai(prompt: str, count: int) -> List[str]:
     """
     Генерация изображений через OpenAI Images API.
+
+    count отдельных запросов с n=1 выполняются параллельно, у каждого
+    свой дедлайн IMAGE_TIMEOUT. Удачные изображения сохраняются,
+    повторяются только недостающие (до IMAGE_RETRY_ROUNDS раз).
+    Может вернуть меньше count изображений; если не удалось ни одного —
+    пробрасывает последнюю ошибку.
     """
 
     if not OPENAI_API_KEY:
         raise RuntimeError("OPENAI_API_KEY is not set")
 
+    images: List[str] = []
+    last_error: Optional[BaseException] = None
+
+    for attempt in range(1 + IMAGE_RETRY_ROUNDS):
+        missing = count - len(images)
+        if missing <= 0:
+            break
+
+        if attempt:
+            logger.warning(
+                "[ImageAgent] Retrying %s of %s images (round %s)", missing, count, attempt
+            )
+
+        results = await asyncio.gather(
+            *(_generate_openai_one(prompt) for _ in range(missing)),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                last_error = result
+                logger.warning("[ImageAgent] Image request failed: %r", result)
+            elif result:
+                images.append(result)
+
+    if not images and last_error is not None:
+        raise last_error
+
+    return images[:count]
+
+
+async def _generate_openai_one(prompt: str) -> Optional[str]:
+    """
+    Одно изображение (n=1) с собственным дедлайном.
+    """
+
     headers = {
         "Authorization": f"Bearer {OPENAI_API_KEY}",
         "Content-Type": "application/json",
@@ -99,17 +199,23 @@ async def _generate_openai(prompt: str, count: int) -> List[str]:
         "prompt": prompt,
         "size": IMAGE_SIZE,
         "quality": IMAGE_QUALITY,
-        "n": count,
+        "n": 1,
     }
 
-    async with aiohttp.ClientSession() as session:
+    async with provider_call("openai", "images"):
+        session = get_http_session()
         async with session.post(
             "https://api.openai.com/v1/images/generations",
             headers=headers,
             json=payload,
-            timeout=aiohttp.ClientTimeout(total=120),
+            timeout=aiohttp.ClientTimeout(total=IMAGE_TIMEOUT),
         ) as response:
 
+            if response.status == 429:
+                raise ProviderOverloaded(
+                    f"OpenAI image API error (429): {await response.text()}"
+                )
+
             if response.status != 200:
                 text = await response.text()
                 raise RuntimeError(
@@ -118,13 +224,12 @@ async def _generate_openai(prompt: str, count: int) -> List[str]:
 
             data = await response.json()
 
-    images = []
     for item in data.get("data", []):
         url = item.get("url")
         if url:
-            images.append(url)
+            return url
 
-    return images
+    return None
 
 
 # =========================
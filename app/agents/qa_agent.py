@@ -1,9 +1,15 @@
 import os
 import json
-from typing import Optional, List, Dict, Any
+import asyncio
+from typing import Optional, List, Dict, Any, Set, Tuple, Union
 
 import aiohttp
 
+from app.core.adaptive_limiter import ProviderOverloaded, provider_call
+from app.core.http_client import get_http_session
+from app.core.cache import TieredCache, make_cache_key
+from app.agents.qa_heuristics import prefilter_articles
+
 
 # =========================
 # Конфигурация
@@ -15,6 +21,26 @@ OPENAI_QA_MODEL = os.getenv("OPENAI_QA_MODEL", "gpt-4o-mini")
 
 QA_TIMEOUT = int(os.getenv("QA_TIMEOUT", "90"))
 
+# Кэш вердиктов: одна и та же статья проверяется в генерации и в каждом издателе
+QA_CACHE_ENABLED = os.getenv("QA_CACHE_ENABLED", "true").lower() == "true"
+QA_CACHE_TTL = int(os.getenv("QA_CACHE_TTL", "86400"))            # секунды
+QA_CACHE_MAX_ITEMS = int(os.getenv("QA_CACHE_MAX_ITEMS", "2000"))  # в памяти процесса
+QA_CACHE_REDIS = os.getenv("QA_CACHE_REDIS", "true").lower() == "true"
+
+# Пакетный QA: до QA_BATCH_SIZE статей в одном вызове модели.
+# Одновременные analyze_article() в пределах QA_BATCH_WINDOW_MS
+# автоматически собираются в один пакет.
+QA_BATCH_ENABLED = os.getenv("QA_BATCH_ENABLED", "true").lower() == "true"
+QA_BATCH_SIZE = int(os.getenv("QA_BATCH_SIZE", "5"))
+QA_BATCH_WINDOW_MS = int(os.getenv("QA_BATCH_WINDOW_MS", "50"))
+
+_qa_cache = TieredCache(
+    namespace="qa",
+    max_items=QA_CACHE_MAX_ITEMS,
+    ttl=QA_CACHE_TTL,
+    use_redis=QA_CACHE_REDIS,
+)
+
 
 # =========================
 # Публичные методы
@@ -23,10 +49,15 @@ QA_TIMEOUT = int(os.getenv("QA_TIMEOUT", "90"))
 async def analyze_article(
     title: str,
     article_text: str,
+    prefilter: bool = True,
 ) -> Dict[str, Any]:
     """
     QA-анализ статьи.
 
+    prefilter=False — сразу модель, без локальных эвристик и пакетов:
+    для текстов, которые не являются статьёй (например, разбор ошибки),
+    структурные проверки бессмысленны и только портят heuristic_stats().
+
     Возвращает:
     {
         "score": float (0-10),
@@ -37,10 +68,18 @@ async def analyze_article(
     }
     """
 
+    if QA_PROVIDER == "openai" and QA_BATCH_ENABLED and prefilter:
+        return await _article_batcher.submit(title, article_text)
+
     prompt = _build_article_prompt(title, article_text)
 
     if QA_PROVIDER == "openai":
-        return await _run_openai_qa(prompt)
+        # Явный брак или явная норма — без вызова модели
+        if prefilter:
+            verdict = prefilter_articles([article_text])[0]
+            if verdict is not None:
+                return verdict
+        return await _run_cached_qa("article", prompt)
 
     if QA_PROVIDER == "stub":
         return _stub_ok()
@@ -61,7 +100,7 @@ async def analyze_image_generation(
     prompt = _build_image_prompt(title, images)
 
     if QA_PROVIDER == "openai":
-        return await _run_openai_qa(prompt)
+        return await _run_cached_qa("image", prompt)
 
     if QA_PROVIDER == "stub":
         return _stub_ok()
@@ -69,6 +108,93 @@ async def analyze_image_generation(
     raise ValueError(f"Unsupported QA_PROVIDER: {QA_PROVIDER}")
 
 
+async def analyze_articles_batch(
+    items: List[Tuple[str, str]],
+) -> List[Dict[str, Any]]:
+    """
+    Пакетный QA-анализ статей.
+
+    items — список (title, article_text).
+    Возвращает вердикты в том же порядке и в той же структуре,
+    что и analyze_article().
+
+    Сначала локальный pre-filter (qa_heuristics) отсекает явную норму
+    и явный брак. Уже проверенные статьи берутся из кэша; остальные
+    уходят в модель пакетами по QA_BATCH_SIZE. Если вердикт для статьи
+    не пришёл или некорректен, статья проверяется отдельным вызовом.
+    """
+
+    results = await _analyze_articles(items)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+async def _analyze_articles(
+    items: List[Tuple[str, str]],
+) -> List[Union[Dict[str, Any], BaseException]]:
+    """
+    analyze_articles_batch, но ошибка вызова модели возвращается на месте
+    статей своего пакета, а не роняет весь список: вердикты из pre-filter,
+    кэша и удачных пакетов остаются.
+    """
+
+    if QA_PROVIDER == "stub":
+        return [_stub_ok() for _ in items]
+
+    if QA_PROVIDER != "openai":
+        raise ValueError(f"Unsupported QA_PROVIDER: {QA_PROVIDER}")
+
+    prompts = [_build_article_prompt(title, text) for title, text in items]
+    keys = [make_cache_key("article", OPENAI_QA_MODEL, prompt) for prompt in prompts]
+    results: List[Any] = prefilter_articles([text for _, text in items])
+
+    misses: List[int] = []
+    for index, key in enumerate(keys):
+        if results[index] is not None:
+            continue
+        if QA_CACHE_ENABLED:
+            results[index] = await _qa_cache.get(key)
+        if results[index] is None:
+            misses.append(index)
+
+    chunks = [
+        misses[start:start + QA_BATCH_SIZE]
+        for start in range(0, len(misses), QA_BATCH_SIZE)
+    ]
+    verdicts = await asyncio.gather(
+        *(_run_openai_batch([items[i] for i in chunk]) for chunk in chunks),
+        return_exceptions=True,
+    )
+
+    fallbacks: List[int] = []
+    for chunk, chunk_verdicts in zip(chunks, verdicts):
+        if isinstance(chunk_verdicts, BaseException):
+            # 429 / таймаут пакета — ошибка только его статьям, без повтора
+            # по одной: перегруженному провайдеру лишние вызовы не нужны
+            for index in chunk:
+                results[index] = chunk_verdicts
+            continue
+
+        for index, verdict in zip(chunk, chunk_verdicts):
+            if verdict is None:
+                fallbacks.append(index)
+                continue
+            results[index] = verdict
+            if QA_CACHE_ENABLED:
+                await _qa_cache.set(keys[index], verdict)
+
+    single = await asyncio.gather(
+        *(_run_cached_qa("article", prompts[i]) for i in fallbacks),
+        return_exceptions=True,
+    )
+    for index, verdict in zip(fallbacks, single):
+        results[index] = verdict
+
+    return results
+
+
 # =========================
 # Prompt builders
 # =========================
@@ -137,11 +263,55 @@ Respond STRICTLY in valid JSON:
 """
 
 
+def _build_batch_article_prompt(items: List[Tuple[str, str]]) -> str:
+    articles = "\n\n".join(
+        f"--- ARTICLE id={index} ---\nTitle:\n{title}\n\nText:\n{text[:3000]}"
+        for index, (title, text) in enumerate(items)
+    )
+
+    return f"""
+You are an automated QA engineer for AI-generated content.
+
+Evaluate EACH of the following {len(items)} ARTICLES independently.
+
+{articles}
+
+For each article check for:
+- logical consistency
+- factual errors (if obvious)
+- structure and readability
+- SEO-friendliness
+- spam / water / repetition
+- safety and policy risks
+
+Respond STRICTLY in valid JSON, one verdict per article id:
+
+{{
+  "results": [
+    {{
+      "id": article id (number),
+      "score": number from 0 to 10,
+      "comment": "short human-readable summary",
+      "severity": "low" | "medium" | "high",
+      "cause": "main problem if any or null",
+      "recommendation": "how to improve or null"
+    }}
+  ]
+}}
+"""
+
+
 # =========================
 # OpenAI QA runner
 # =========================
 
 async def _run_openai_qa(prompt: str) -> Dict[str, Any]:
+    content = await _openai_chat(prompt)
+
+    return _safe_parse_response(content)
+
+
+async def _openai_chat(prompt: str, json_mode: bool = False) -> str:
     if not OPENAI_API_KEY:
         raise RuntimeError("OPENAI_API_KEY is not set")
 
@@ -165,7 +335,11 @@ async def _run_openai_qa(prompt: str) -> Dict[str, Any]:
         "temperature": 0.2,
     }
 
-    async with aiohttp.ClientSession() as session:
+    if json_mode:
+        payload["response_format"] = {"type": "json_object"}
+
+    async with provider_call("openai", "chat"):
+        session = get_http_session()
         async with session.post(
             "https://api.openai.com/v1/chat/completions",
             headers=headers,
@@ -173,6 +347,11 @@ async def _run_openai_qa(prompt: str) -> Dict[str, Any]:
             timeout=aiohttp.ClientTimeout(total=QA_TIMEOUT),
         ) as response:
 
+            if response.status == 429:
+                raise ProviderOverloaded(
+                    f"QA OpenAI API error (429): {await response.text()}"
+                )
+
             if response.status != 200:
                 text = await response.text()
                 raise RuntimeError(
@@ -181,15 +360,144 @@ async def _run_openai_qa(prompt: str) -> Dict[str, Any]:
 
             data = await response.json()
 
-    content = data["choices"][0]["message"]["content"]
+    return data["choices"][0]["message"]["content"]
 
-    return _safe_parse_response(content)
+
+async def _run_openai_batch(
+    items: List[Tuple[str, str]],
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Один вызов модели на пакет статей.
+    None на месте статьи — вердикт отсутствует или некорректен.
+    """
+
+    if len(items) == 1:
+        # Пакет из одной статьи — обычный промт, он короче
+        return [None]
+
+    try:
+        content = await _openai_chat(_build_batch_article_prompt(items), json_mode=True)
+        parsed = json.loads(content)
+        raw_results = parsed.get("results", []) if isinstance(parsed, dict) else parsed
+    except (ValueError, AttributeError):
+        return [None] * len(items)
+
+    verdicts: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    for raw in raw_results if isinstance(raw_results, list) else []:
+        if not isinstance(raw, dict):
+            continue
+        index = raw.get("id")
+        score = raw.get("score")
+        if (
+            not isinstance(index, int)
+            or not 0 <= index < len(items)
+            or not isinstance(score, (int, float))
+        ):
+            continue
+        verdicts[index] = _normalize_verdict(raw)
+
+    return verdicts
+
+
+class _ArticleBatcher:
+    """
+    Собирает одновременные analyze_article() в пакеты.
+
+    Первый запрос открывает окно QA_BATCH_WINDOW_MS; пакет уходит
+    по истечении окна или сразу при наборе QA_BATCH_SIZE статей.
+    Так конкурентные таски планировщика и массовые прогоны используют
+    пакетный режим без изменений в вызывающем коде.
+    """
+
+    def __init__(self):
+        self._pending: List[Tuple[str, str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # loop держит на задачи только слабые ссылки — храним их до завершения
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, title: str, article_text: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((title, article_text, future))
+
+        if len(self._pending) >= QA_BATCH_SIZE:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(QA_BATCH_WINDOW_MS / 1000, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, str, asyncio.Future]]) -> None:
+        try:
+            verdicts = await _analyze_articles(
+                [(title, text) for title, text, _ in batch]
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, future), verdict in zip(batch, verdicts):
+            if future.done():
+                continue
+            if isinstance(verdict, BaseException):
+                future.set_exception(verdict)
+            else:
+                future.set_result(verdict)
+
+
+_article_batcher = _ArticleBatcher()
+
+
+# =========================
+# QA cache
+# =========================
+
+async def _run_cached_qa(prompt_type: str, prompt: str) -> Dict[str, Any]:
+    """
+    QA через кэш, ключ — (тип промта, модель, промт).
+
+    Одновременные запросы с одним ключом выполняются одним вызовом модели.
+    Неразобранные ответы не кэшируются — следующая попытка может быть успешной.
+    """
+
+    if not QA_CACHE_ENABLED:
+        return await _run_openai_qa(prompt)
+
+    key = make_cache_key(prompt_type, OPENAI_QA_MODEL, prompt)
+    return await _qa_cache.get_or_compute(
+        key,
+        lambda: _run_openai_qa(prompt),
+        should_cache=lambda result: result.get("cause") != _PARSE_FAILED_CAUSE,
+    )
+
+
+def qa_cache_stats() -> Dict[str, Any]:
+    """
+    Счётчики попаданий / промахов QA-кэша.
+    """
+    return _qa_cache.stats()
 
 
 # =========================
 # Helpers
 # =========================
 
+_PARSE_FAILED_CAUSE = "Invalid JSON from QA model"
+
+
 def _safe_parse_response(raw: str) -> Dict[str, Any]:
     """
     Гарантирует, что QA всегда вернёт валидную структуру.
@@ -202,10 +510,14 @@ def _safe_parse_response(raw: str) -> Dict[str, Any]:
             "score": 0,
             "comment": "QA response parsing failed",
             "severity": "high",
-            "cause": "Invalid JSON from QA model",
+            "cause": _PARSE_FAILED_CAUSE,
             "recommendation": "Inspect QA prompt or provider",
         }
 
+    return _normalize_verdict(parsed)
+
+
+def _normalize_verdict(parsed: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "score": float(parsed.get("score", 0)),
         "comment": str(parsed.get("comment", "")),
@@ -0,0 +1,197 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+# =========================
+# Конфигурация
+# =========================
+
+QA_HEURISTICS_ENABLED = os.getenv("QA_HEURISTICS_ENABLED", "true").lower() == "true"
+
+# Вердикт без LLM: score >= PASS — явно нормальная статья, score <= FAIL — явный брак
+QA_HEURISTIC_PASS = float(os.getenv("QA_HEURISTIC_PASS", "9.5"))
+QA_HEURISTIC_FAIL = float(os.getenv("QA_HEURISTIC_FAIL", "3.0"))
+
+# Ожидаемая длина статьи в символах (length="medium" в article_agent)
+QA_TARGET_LENGTH = int(os.getenv("QA_TARGET_LENGTH", "3000"))
+
+# Проверки частичного текста при потоковой генерации
+QA_STREAM_MAX_LENGTH_FACTOR = float(os.getenv("QA_STREAM_MAX_LENGTH_FACTOR", "3"))
+QA_STREAM_LOOP_WINDOW = int(os.getenv("QA_STREAM_LOOP_WINDOW", "200"))      # последних слов
+QA_STREAM_LOOP_THRESHOLD = float(os.getenv("QA_STREAM_LOOP_THRESHOLD", "0.5"))
+
+# Промт статьи запрещает упоминания ИИ — их появление значит, что генерация пошла не туда
+_FORBIDDEN_PHRASES = (
+    "как языковая модель",
+    "как искусственный интеллект",
+    "я не могу выполнить",
+    "as an ai",
+    "as a language model",
+)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_END = (".", "!", "?", "…", "»", '"', ")")
+
+_stats: Dict[str, int] = {
+    "checked": 0,
+    "skipped_pass": 0,
+    "skipped_fail": 0,
+    "sent_to_llm": 0,
+}
+
+
+# =========================
+# Признаки текста
+# =========================
+
+def _features(text: str) -> List[float]:
+    """
+    [символов, слов, доля повторных слов, доля повторных триграмм,
+     абзацев, доля самого длинного абзаца, обрыв в конце]
+    """
+
+    text = (text or "").strip()
+    words = [word.lower() for word in _WORD_RE.findall(text)]
+    paragraphs = [p for p in _PARAGRAPH_RE.split(text) if p.strip()]
+
+    word_count = len(words)
+    repetition = 1 - len(set(words)) / word_count if word_count else 0.0
+
+    trigrams = list(zip(words, words[1:], words[2:]))
+    trigram_dup = 1 - len(set(trigrams)) / len(trigrams) if trigrams else 0.0
+
+    longest_share = (
+        max(len(p) for p in paragraphs) / len(text) if paragraphs and text else 1.0
+    )
+    truncated = 1.0 if text and not text.endswith(_SENTENCE_END) else 0.0
+
+    return [
+        float(len(text)),
+        float(word_count),
+        repetition,
+        trigram_dup,
+        float(len(paragraphs)),
+        longest_share,
+        truncated,
+    ]
+
+
+def score_articles(texts: Sequence[str], target_length: int = QA_TARGET_LENGTH) -> np.ndarray:
+    """
+    Локальная оценка 0–10 для пачки текстов.
+
+    Разбор текста — по одному, сами штрафы считаются векторно
+    по матрице признаков (n_texts x n_features).
+    """
+
+    if not texts:
+        return np.zeros(0)
+
+    f = np.array([_features(text) for text in texts], dtype=float)
+    chars, words, repetition, trigram_dup, paragraphs, longest_share, truncated = f.T
+
+    length_ratio = chars / max(target_length, 1)
+
+    penalty = (
+        # Повтор слов: в живом тексте ~0.4–0.55, выше — вода и самоповторы
+        np.clip((repetition - 0.6) / 0.25, 0, 1) * 4
+        # Повтор триграмм — признак зацикливания генерации
+        + np.clip((trigram_dup - 0.05) / 0.2, 0, 1) * 5
+        # Слишком коротко / слишком длинно относительно цели
+        + np.clip((0.4 - length_ratio) / 0.4, 0, 1) * 5
+        + np.clip((length_ratio - 2.0) / 1.0, 0, 1) * 3
+        # Нет абзацев или один абзац на весь текст
+        + (paragraphs < 2) * 2.0
+        + np.clip((longest_share - 0.6) / 0.4, 0, 1) * 1.5
+        # Текст оборван на полуслове
+        + truncated * 3.0
+    )
+
+    scores = np.clip(10.0 - penalty, 0.0, 10.0)
+    scores[words == 0] = 0.0
+    return scores
+
+
+def check_partial_article(text: str, target_length: int = QA_TARGET_LENGTH) -> Optional[str]:
+    """
+    Дешёвые проверки незаконченного текста (потоковая генерация).
+
+    Возвращает причину, по которой поток стоит оборвать, или None.
+    """
+
+    if len(text) > target_length * QA_STREAM_MAX_LENGTH_FACTOR:
+        return f"Article exceeds {QA_STREAM_MAX_LENGTH_FACTOR:g}x target length"
+
+    lowered = text.lower()
+    for phrase in _FORBIDDEN_PHRASES:
+        if phrase in lowered:
+            return f"Forbidden phrase in article: {phrase!r}"
+
+    # Зацикливание: хвост текста состоит из повторяющихся триграмм
+    words = [word.lower() for word in _WORD_RE.findall(text)][-QA_STREAM_LOOP_WINDOW:]
+    trigrams = list(zip(words, words[1:], words[2:]))
+    if len(trigrams) >= 30:
+        duplication = 1 - len(set(trigrams)) / len(trigrams)
+        if duplication >= QA_STREAM_LOOP_THRESHOLD:
+            return f"Generation is looping (trigram duplication {duplication:.2f})"
+
+    return None
+
+
+# =========================
+# Pre-filter перед LLM QA
+# =========================
+
+def prefilter_articles(texts: Sequence[str]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Для каждого текста — готовый вердикт (структура как у analyze_article)
+    или None, если уверенности нет и нужна проверка моделью.
+    """
+
+    if not QA_HEURISTICS_ENABLED or not texts:
+        return [None] * len(texts)
+
+    scores = score_articles(texts)
+    _stats["checked"] += len(texts)
+
+    verdicts: List[Optional[Dict[str, Any]]] = []
+    for score in scores.tolist():
+        if score >= QA_HEURISTIC_PASS:
+            _stats["skipped_pass"] += 1
+            verdicts.append({
+                "score": round(score, 2),
+                "comment": "Heuristic QA: structure, length and repetition look fine",
+                "severity": "low",
+                "cause": None,
+                "recommendation": None,
+            })
+        elif score <= QA_HEURISTIC_FAIL:
+            _stats["skipped_fail"] += 1
+            verdicts.append({
+                "score": round(score, 2),
+                "comment": "Heuristic QA: text is empty, truncated, repetitive or off-length",
+                "severity": "high",
+                "cause": "Failed local structural checks",
+                "recommendation": "Regenerate the article",
+            })
+        else:
+            _stats["sent_to_llm"] += 1
+            verdicts.append(None)
+
+    return verdicts
+
+
+def heuristic_stats() -> Dict[str, Any]:
+    """
+    Как часто LLM QA удалось пропустить.
+    """
+
+    stats: Dict[str, Any] = dict(_stats)
+    checked = stats["checked"]
+    skipped = stats["skipped_pass"] + stats["skipped_fail"]
+    stats["skip_ratio"] = round(skipped / checked, 3) if checked else 0.0
+    return stats
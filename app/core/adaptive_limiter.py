@@ -0,0 +1,172 @@
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from app.core.rate_limiter import rate_limit
+
+
+logger = logging.getLogger(__name__)
+
+
+# =========================
+# Конфигурация
+# =========================
+
+AIMD_INITIAL_LIMIT = float(os.getenv("AIMD_INITIAL_LIMIT", "4"))
+AIMD_MIN_LIMIT = float(os.getenv("AIMD_MIN_LIMIT", "1"))
+AIMD_MAX_LIMIT = float(os.getenv("AIMD_MAX_LIMIT", "64"))
+AIMD_INCREASE = float(os.getenv("AIMD_INCREASE", "1"))        # +N за "окно" успешных вызовов
+AIMD_DECREASE = float(os.getenv("AIMD_DECREASE", "0.5"))      # x0.5 на 429 / таймаут
+AIMD_LATENCY_TARGET = float(os.getenv("AIMD_LATENCY_TARGET", "30"))  # сек, выше — не растём
+
+
+class ProviderOverloaded(RuntimeError):
+    """
+    Провайдер сообщил о перегрузке (HTTP 429, flood wait, too many requests).
+    """
+
+
+# =========================
+# AIMD limiter
+# =========================
+
+class AdaptiveLimiter:
+    """
+    Адаптивный лимит одновременных запросов к провайдеру (AIMD).
+
+    - Успешный быстрый вызов: limit += increase / limit
+      (примерно +increase за каждый "полный круг" из limit вызовов)
+    - ProviderOverloaded или таймаут: limit *= decrease,
+      не чаще одного раза за средний round-trip — одна волна 429
+      не должна обнулить лимит
+    - Медленные вызовы (выше latency_target) лимит не увеличивают
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: float = AIMD_INITIAL_LIMIT,
+        min_limit: float = AIMD_MIN_LIMIT,
+        max_limit: float = AIMD_MAX_LIMIT,
+        increase: float = AIMD_INCREASE,
+        decrease: float = AIMD_DECREASE,
+        latency_target: float = AIMD_LATENCY_TARGET,
+    ):
+        self.name = name
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+
+        self.in_flight = 0
+        self.avg_latency: Optional[float] = None
+        self.successes = 0
+        self.overloads = 0
+
+        self._last_decrease = 0.0
+        self._condition: Optional[asyncio.Condition] = None
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self._acquire()
+        started = time.monotonic()
+        try:
+            yield
+        except (ProviderOverloaded, asyncio.TimeoutError):
+            self._on_overload()
+            raise
+        else:
+            self._on_success(time.monotonic() - started)
+        finally:
+            await self._release()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "avg_latency": round(self.avg_latency or 0.0, 3),
+            "successes": self.successes,
+            "overloads": self.overloads,
+        }
+
+    # --- internals ---
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Создаём лениво, внутри работающего loop
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def _acquire(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            while self.in_flight >= int(self.limit):
+                await condition.wait()
+            self.in_flight += 1
+
+    async def _release(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    def _on_success(self, latency: float) -> None:
+        self.successes += 1
+        if self.avg_latency is None:
+            self.avg_latency = latency
+        else:
+            self.avg_latency = 0.8 * self.avg_latency + 0.2 * latency
+
+        if latency <= self.latency_target:
+            self.limit = min(self.max_limit, self.limit + self.increase / max(self.limit, 1.0))
+
+    def _on_overload(self) -> None:
+        self.overloads += 1
+        now = time.monotonic()
+        if now - self._last_decrease < (self.avg_latency or 1.0):
+            return
+
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.decrease)
+        logger.warning("[AIMD] %s overloaded, limit -> %.2f", self.name, self.limit)
+
+
+# =========================
+# Реестр по провайдерам
+# =========================
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+def get_limiter(provider: str) -> AdaptiveLimiter:
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        limiter = _limiters[provider] = AdaptiveLimiter(provider)
+    return limiter
+
+
+def current_limits() -> Dict[str, Dict[str, float]]:
+    """
+    Текущие лимиты и статистика по всем провайдерам — для логов и мониторинга.
+    """
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
+
+
+@asynccontextmanager
+async def provider_call(provider: str, endpoint: Optional[str] = None) -> AsyncIterator[None]:
+    """
+    Обёртка над исходящим вызовом: rate limit (токены) + адаптивный
+    лимит одновременных запросов провайдера.
+
+        async with provider_call("openai", "chat"):
+            ...  # HTTP-запрос; на 429 — raise ProviderOverloaded
+    """
+
+    await rate_limit(provider, endpoint)
+    async with get_limiter(provider).slot():
+        yield
@@ -0,0 +1,297 @@
+import io
+import os
+import mmap
+import asyncio
+import hashlib
+import logging
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import aiohttp
+
+from app.core.http_client import get_http_session
+
+
+logger = logging.getLogger(__name__)
+
+
+# =========================
+# Конфигурация
+# =========================
+
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "data/blobs")
+BLOB_DOWNLOAD_TIMEOUT = float(os.getenv("BLOB_DOWNLOAD_TIMEOUT", "60"))   # секунды на изображение
+
+# Процессы для ресайза/сжатия (CPU-bound, GIL). 0 — в потоках loop executor.
+# В демонических процессах (prefork-дети Celery) всегда потоки
+BLOB_PROCESS_WORKERS = int(os.getenv("BLOB_PROCESS_WORKERS", "2"))
+
+# Варианты под площадки: платформа=максимальная сторона:качество JPEG
+IMAGE_VARIANTS = os.getenv("IMAGE_VARIANTS", "telegram=1280:87,vk=1600:90")
+
+
+def parse_variants(raw: str) -> Dict[str, Tuple[int, int]]:
+    """
+    "telegram=1280:87,vk=1600:90" -> {"telegram": (1280, 87), "vk": (1600, 90)}
+    """
+
+    variants: Dict[str, Tuple[int, int]] = {}
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        platform, spec = item.split("=", 1)
+        max_side, _, quality = spec.partition(":")
+        variants[platform.strip()] = (int(max_side), int(quality or 85))
+    return variants
+
+
+_variants = parse_variants(IMAGE_VARIANTS)
+
+
+# =========================
+# Хранилище на диске
+# =========================
+#
+# Ключ блоба — sha256 содержимого, путь — <dir>/ab/cd/<sha256>.
+# Одинаковые изображения хранятся один раз; запись атомарная
+# (временный файл + os.replace), поэтому параллельные воркеры
+# могут писать один и тот же блоб без блокировок.
+
+def blob_path(digest: str) -> str:
+    return os.path.join(BLOB_STORE_DIR, digest[:2], digest[2:4], digest)
+
+
+def has_blob(digest: str) -> bool:
+    return os.path.exists(blob_path(digest))
+
+
+def _write_blob(data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest)
+    if os.path.exists(path):
+        return digest
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    return digest
+
+
+async def store_blob(data: bytes) -> str:
+    """
+    Сохраняет байты и возвращает их sha256.
+    """
+    return await asyncio.to_thread(_write_blob, data)
+
+
+@contextmanager
+def open_blob(digest: str) -> Iterator[memoryview]:
+    """
+    Отдаёт содержимое блоба через mmap, без чтения файла в память процесса.
+
+        with open_blob(digest) as view:
+            ...  # view[start:end], len(view)
+
+    view действителен только внутри with.
+    """
+
+    with open(blob_path(digest), "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        try:
+            yield view
+        finally:
+            view.release()
+            mapped.close()
+
+
+# =========================
+# Варианты под площадки
+# =========================
+
+def _render_variant(source_digest: str, max_side: int, quality: int) -> str:
+    """
+    Выполняется в дочернем процессе: ресайз + JPEG, результат — новый блоб.
+    """
+
+    from PIL import Image
+
+    with Image.open(blob_path(source_digest)) as image:
+        image = image.convert("RGB")
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+
+    return _write_blob(buffer.getvalue())
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_disabled = False
+
+
+def _is_daemon_process() -> bool:
+    """
+    Демоническому процессу нельзя порождать дочерние. Prefork-пул Celery
+    запускает детей через billiard, поэтому проверяем оба модуля.
+    """
+
+    if multiprocessing.current_process().daemon:
+        return True
+    try:
+        import billiard
+    except ImportError:
+        return False
+    return bool(billiard.current_process().daemon)
+
+
+def _get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Пул процессов для вариантов или None — тогда потоки loop executor.
+
+    Процессы стартуют через spawn: fork процесса с работающим event loop
+    и потоками небезопасен.
+    """
+
+    global _process_pool, _process_pool_disabled
+    if BLOB_PROCESS_WORKERS <= 0 or _process_pool_disabled:
+        return None
+
+    if _process_pool is None:
+        if _is_daemon_process():
+            logger.info("Blob store: daemonic worker process, rendering variants in threads")
+            _process_pool_disabled = True
+            return None
+        try:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=BLOB_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        except Exception:
+            logger.exception("Blob store: process pool unavailable, rendering variants in threads")
+            _process_pool_disabled = True
+            return None
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    """
+    Останавливает процессы ресайза (при остановке worker-процесса).
+    """
+
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
+
+
+async def make_variants(digest: str) -> Dict[str, str]:
+    """
+    Платформа -> sha256 варианта. Варианты считаются параллельно в пуле процессов.
+    """
+
+    global _process_pool, _process_pool_disabled
+
+    loop = asyncio.get_running_loop()
+    pool = _get_process_pool()
+
+    platforms = list(_variants)
+
+    async def render(executor: Optional[ProcessPoolExecutor]) -> List[str]:
+        return await asyncio.gather(*(
+            loop.run_in_executor(executor, _render_variant, digest, *_variants[platform])
+            for platform in platforms
+        ))
+
+    try:
+        results = await render(pool)
+    except (BrokenProcessPool, OSError):
+        # Процессы не стартовали или умерли — дальше работаем в потоках
+        logger.exception("Blob store: process pool broken, rendering variants in threads")
+        _process_pool = None
+        _process_pool_disabled = True
+        results = await render(None)
+
+    return dict(zip(platforms, results))
+
+
+# =========================
+# Загрузка изображений провайдера
+# =========================
+
+async def store_image(url: str) -> Dict[str, Any]:
+    """
+    Скачивает изображение один раз, сохраняет оригинал и варианты.
+
+    Возвращает {"url": ..., "sha256": ..., "variants": {платформа: sha256}}.
+    Если варианты не получились, оригинал остаётся (variants пустой) —
+    издатели отправят его.
+    """
+
+    session = get_http_session()
+    async with session.get(
+        url, timeout=aiohttp.ClientTimeout(total=BLOB_DOWNLOAD_TIMEOUT)
+    ) as response:
+        if response.status != 200:
+            raise RuntimeError(f"Image download failed ({response.status}): {url}")
+        data = await response.read()
+
+    digest = await store_blob(data)
+
+    try:
+        variants = await make_variants(digest)
+    except Exception:
+        logger.exception("Blob store: failed to render variants for %s (%s)", url, digest)
+        variants = {}
+
+    return {"url": url, "sha256": digest, "variants": variants}
+
+
+async def store_images(urls: List[str]) -> List[Dict[str, Any]]:
+    """
+    store_image для списка URL. Неудачная загрузка не роняет стадию:
+    для такого изображения остаётся только {"url": ...}, издатель
+    отправит ссылку как раньше.
+    """
+
+    results = await asyncio.gather(
+        *(store_image(url) for url in urls), return_exceptions=True
+    )
+
+    blobs: List[Dict[str, Any]] = []
+    for url, result in zip(urls, results):
+        if isinstance(result, BaseException):
+            logger.error("Blob store: failed to store %s: %r", url, result)
+            blobs.append({"url": url})
+        else:
+            blobs.append(result)
+    return blobs
+
+
+def variant_digest(blob: Optional[Dict[str, Any]], platform: str) -> Optional[str]:
+    """
+    sha256 варианта под платформу (или оригинала), если он есть на диске.
+    """
+
+    if not blob:
+        return None
+
+    digest = (blob.get("variants") or {}).get(platform) or blob.get("sha256")
+    if digest and has_blob(digest):
+        return digest
+    return None
@@ -0,0 +1,234 @@
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.redis_client import get_redis
+
+
+logger = logging.getLogger(__name__)
+
+
+# Режимы кэша генерации: reuse — отдать готовый результат,
+# refresh — сгенерировать заново и перезаписать, off — кэш не трогать
+CACHE_REUSE = "reuse"
+CACHE_REFRESH = "refresh"
+CACHE_OFF = "off"
+CACHE_MODES = (CACHE_REUSE, CACHE_REFRESH, CACHE_OFF)
+
+
+def make_cache_key(*parts: Any) -> str:
+    """
+    Content-addressed ключ: sha256 от нормализованных частей.
+    """
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Схлопывает пробелы и переводы строк: промты, отличающиеся
+    только форматированием, дают один ключ.
+    """
+    return " ".join(prompt.split())
+
+
+# =========================
+# In-process tier
+# =========================
+
+class LRUCache:
+    """
+    LRU с TTL в памяти процесса. Значения хранятся как есть (без копирования).
+    """
+
+    def __init__(self, max_items: int, ttl: float):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._items[key]
+            return None
+
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._items.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+# =========================
+# Двухуровневый кэш
+# =========================
+
+class TieredCache:
+    """
+    Кэш в два уровня: LRU процесса + Redis (общий для воркеров).
+
+    - Значения в Redis хранятся как JSON с тем же TTL
+    - redis_max_items ограничивает число ключей в Redis: индекс
+      в sorted set по времени последнего обращения, лишние вытесняются
+    - Попадание в Redis поднимает значение в LRU процесса
+    - Ошибки Redis считаются промахом: кэш не должен ронять pipeline
+    - get_or_compute() схлопывает одновременные запросы одного ключа
+      в один вызов factory
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_items: int,
+        ttl: float,
+        use_redis: bool = True,
+        redis_max_items: Optional[int] = None,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self.redis_max_items = redis_max_items
+        self.local = LRUCache(max_items=max_items, ttl=ttl)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats: Dict[str, int] = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "redis_errors": 0,
+            "evictions": 0,
+        }
+
+    def _redis_key(self, key: str) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    def _index_key(self) -> str:
+        return f"cache:{self.namespace}:__index__"
+
+    async def _touch(self, key: str) -> None:
+        """
+        Обновляет время обращения в индексе и вытесняет самые старые ключи.
+        """
+
+        if not self.redis_max_items:
+            return
+
+        redis = get_redis()
+        index = self._index_key()
+        await redis.zadd(index, {key: time.time()})
+
+        excess = await redis.zcard(index) - self.redis_max_items
+        if excess > 0:
+            evicted = [member for member, _ in await redis.zpopmin(index, excess)]
+            if evicted:
+                await redis.delete(*(self._redis_key(member) for member in evicted))
+                self._stats["evictions"] += len(evicted)
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.local.get(key)
+        if value is not None:
+            self._stats["local_hits"] += 1
+            return value
+
+        if self.use_redis:
+            try:
+                raw = await get_redis().get(self._redis_key(key))
+            except Exception as e:
+                self._stats["redis_errors"] += 1
+                logger.warning("Cache %s: Redis get failed: %s", self.namespace, e)
+                raw = None
+
+            if raw is not None:
+                value = json.loads(raw)
+                self.local.set(key, value)
+                self._stats["redis_hits"] += 1
+                try:
+                    await self._touch(key)
+                except Exception as e:
+                    self._stats["redis_errors"] += 1
+                    logger.warning("Cache %s: Redis index update failed: %s", self.namespace, e)
+                return value
+
+        self._stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        self.local.set(key, value)
+
+        if self.use_redis:
+            try:
+                await get_redis().set(
+                    self._redis_key(key),
+                    json.dumps(value, ensure_ascii=False),
+                    ex=int(self.ttl),
+                )
+                await self._touch(key)
+            except Exception as e:
+                self._stats["redis_errors"] += 1
+                logger.warning("Cache %s: Redis set failed: %s", self.namespace, e)
+
+    async def delete(self, key: str) -> None:
+        self.local.delete(key)
+
+        if self.use_redis:
+            try:
+                await get_redis().delete(self._redis_key(key))
+                if self.redis_max_items:
+                    await get_redis().zrem(self._index_key(), key)
+            except Exception as e:
+                self._stats["redis_errors"] += 1
+                logger.warning("Cache %s: Redis delete failed: %s", self.namespace, e)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        should_cache: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await factory()
+            if value is not None and should_cache(value):
+                await self.set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Ошибку уже пробросим здесь; ожидающих может не быть
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self._stats)
+        hits = stats["local_hits"] + stats["redis_hits"]
+        total = hits + stats["misses"]
+        stats["size"] = len(self.local)
+        stats["hit_ratio"] = round(hits / total, 3) if total else 0.0
+        return stats
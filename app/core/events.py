@@ -0,0 +1,84 @@
+import os
+import logging
+from typing import AsyncIterator
+
+from redis.exceptions import ResponseError
+
+from app.core.redis_client import get_redis
+
+
+logger = logging.getLogger(__name__)
+
+
+# =========================
+# Конфигурация
+# =========================
+
+CONTENT_EVENTS_STREAM = os.getenv("CONTENT_EVENTS_STREAM", "content_items:created")
+CONTENT_EVENTS_MAXLEN = int(os.getenv("CONTENT_EVENTS_MAXLEN", "10000"))
+
+
+# =========================
+# Публикация
+# =========================
+
+async def publish_content_created(content_item_id: int) -> None:
+    """
+    Сообщает планировщику о новом draft content_item.
+
+    Поток обрезается до CONTENT_EVENTS_MAXLEN: потерянное событие не страшно,
+    элемент всё равно подхватит периодическая сверка планировщика.
+    """
+
+    await get_redis().xadd(
+        CONTENT_EVENTS_STREAM,
+        {"content_item_id": str(content_item_id)},
+        maxlen=CONTENT_EVENTS_MAXLEN,
+        approximate=True,
+    )
+
+
+# =========================
+# Потребление
+# =========================
+
+async def consume_content_created(
+    group: str,
+    consumer: str,
+    block_ms: int = 5000,
+    count: int = 50,
+) -> AsyncIterator[int]:
+    """
+    Бесконечно отдаёт ID новых content_items из Redis stream.
+
+    Используется consumer group: несколько реплик планировщика делят
+    события между собой. Сообщение подтверждается сразу после чтения —
+    повторную обработку после падения обеспечивает lease + сверка.
+    """
+
+    client = get_redis()
+
+    try:
+        await client.xgroup_create(
+            CONTENT_EVENTS_STREAM, group, id="$", mkstream=True
+        )
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+    while True:
+        response = await client.xreadgroup(
+            group,
+            consumer,
+            {CONTENT_EVENTS_STREAM: ">"},
+            count=count,
+            block=block_ms,
+        )
+
+        for _, messages in response or []:
+            for message_id, fields in messages:
+                await client.xack(CONTENT_EVENTS_STREAM, group, message_id)
+                try:
+                    yield int(fields["content_item_id"])
+                except (KeyError, ValueError):
+                    logger.warning("Malformed content event %s: %s", message_id, fields)
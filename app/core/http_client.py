@@ -0,0 +1,118 @@
+import os
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import aiohttp
+
+
+logger = logging.getLogger(__name__)
+
+
+# =========================
+# Конфигурация
+# =========================
+
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))                # соединений всего
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))          # секунды
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))  # секунды
+
+
+# =========================
+# Общий ClientSession процесса
+# =========================
+#
+# Агенты и издатели берут сессию через get_http_session(), а не создают
+# aiohttp.ClientSession на каждый запрос: DNS, TCP и TLS оплачиваются
+# один раз на соединение, дальше соединение берётся из пула keep-alive.
+
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+_stats: Dict[str, int] = {
+    "connections_created": 0,
+    "connections_reused": 0,
+    "dns_cache_hits": 0,
+    "dns_cache_misses": 0,
+    "requests": 0,
+}
+
+
+def _build_trace_config() -> aiohttp.TraceConfig:
+    trace_config = aiohttp.TraceConfig()
+
+    def counter(name: str):
+        async def handler(session, context, params) -> None:
+            _stats[name] += 1
+        return handler
+
+    trace_config.on_connection_create_end.append(counter("connections_created"))
+    trace_config.on_connection_reuseconn.append(counter("connections_reused"))
+    trace_config.on_dns_cache_hit.append(counter("dns_cache_hits"))
+    trace_config.on_dns_cache_miss.append(counter("dns_cache_misses"))
+    trace_config.on_request_start.append(counter("requests"))
+    return trace_config
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    Возвращает общую сессию для текущего event loop (создаёт при первом вызове).
+    Вызывать только из корутины.
+    """
+
+    global _session, _session_loop
+
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            use_dns_cache=True,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            trace_configs=[_build_trace_config()],
+        )
+        _session_loop = loop
+
+    return _session
+
+
+async def start_http_session() -> None:
+    """
+    Создание сессии при старте процесса (worker / scheduler).
+    """
+    get_http_session()
+
+
+async def close_http_session() -> None:
+    """
+    Корректное закрытие пула при остановке процесса.
+    """
+
+    global _session, _session_loop
+
+    if _session is not None and not _session.closed:
+        await _session.close()
+        # aiohttp рекомендует дать время закрыться SSL-соединениям
+        await asyncio.sleep(0.25)
+
+    _session = None
+    _session_loop = None
+    logger.info("HTTP pool closed, stats: %s", pool_stats())
+
+
+def pool_stats() -> Dict[str, int]:
+    """
+    Статистика пула: сколько соединений создано и сколько переиспользовано.
+    """
+
+    stats = dict(_stats)
+    if _session is not None and not _session.closed:
+        connector = _session.connector
+        stats["limit"] = connector.limit
+        stats["limit_per_host"] = connector.limit_per_host
+    return stats
@@ -0,0 +1,204 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+
+from app.core.redis_client import get_redis
+
+
+logger = logging.getLogger(__name__)
+
+
+# =========================
+# Конфигурация
+# =========================
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "redis")  # redis | memory
+
+# Формат: "<bucket>=<токенов в секунду>/<ёмкость>", через запятую.
+# bucket — провайдер ("openai") или провайдер:эндпоинт ("openai:images").
+DEFAULT_RATE_LIMITS = (
+    "openai=5/10,"
+    "openai:chat=4/8,"
+    "openai:images=1/3,"
+    "telegram=25/30,"
+    "telegram:sendMessage=1/3,"
+    "telegram:sendPhoto=1/3,"
+    "telegram:sendMediaGroup=1/3,"
+    "vk=3/3"
+)
+RATE_LIMITS = os.getenv("RATE_LIMITS", DEFAULT_RATE_LIMITS)
+
+RATE_LIMIT_KEY_PREFIX = "ratelimit:"
+
+
+def parse_rate_limits(raw: str) -> Dict[str, Tuple[float, float]]:
+    """
+    "openai=5/10,vk=3/3" -> {"openai": (5.0, 10.0), "vk": (3.0, 3.0)}
+    """
+
+    limits: Dict[str, Tuple[float, float]] = {}
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        bucket, spec = item.split("=", 1)
+        rate, _, capacity = spec.partition("/")
+        limits[bucket.strip()] = (float(rate), float(capacity or rate))
+    return limits
+
+
+# =========================
+# Backends
+# =========================
+
+class InMemoryTokenBucketBackend:
+    """
+    Token bucket в памяти процесса. Для тестов и одиночного процесса.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, ts)
+
+    async def take(self, key: str, rate: float, capacity: float, tokens: float = 1) -> float:
+        """
+        Пытается списать tokens. Возвращает 0, если списано,
+        иначе — сколько секунд подождать до следующей попытки.
+        """
+
+        now = time.monotonic()
+        available, updated_at = self._buckets.get(key, (capacity, now))
+        available = min(capacity, available + (now - updated_at) * rate)
+
+        if available >= tokens:
+            self._buckets[key] = (available - tokens, now)
+            return 0.0
+
+        self._buckets[key] = (available, now)
+        return (tokens - available) / rate
+
+
+# Атомарное пополнение и списание на стороне Redis: все воркеры кластера
+# делят один bucket. Время берётся из Redis, чтобы не зависеть от часов хостов.
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local available = tonumber(data[1]) or capacity
+local updated_at = tonumber(data[2]) or now
+available = math.min(capacity, available + (now - updated_at) * rate)
+
+local wait = 0
+if available >= requested then
+  available = available - requested
+else
+  wait = (requested - available) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', available, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisTokenBucketBackend:
+    """
+    Token bucket в Redis, общий для всех процессов и хостов.
+    """
+
+    def __init__(self, prefix: str = RATE_LIMIT_KEY_PREFIX):
+        self.prefix = prefix
+        self._script = None
+
+    async def take(self, key: str, rate: float, capacity: float, tokens: float = 1) -> float:
+        if self._script is None:
+            self._script = get_redis().register_script(_TOKEN_BUCKET_LUA)
+
+        wait = await self._script(
+            keys=[self.prefix + key],
+            args=[rate, capacity, tokens],
+        )
+        return float(wait)
+
+
+# =========================
+# Rate limiter
+# =========================
+
+class RateLimiter:
+    """
+    Ограничитель по провайдерам и эндпоинтам.
+
+    acquire("openai", "images") ждёт токен в bucket "openai" и затем
+    в "openai:images" (если такие bucket'ы настроены). Ожидание —
+    asyncio.sleep, event loop не блокируется.
+
+    Если Redis недоступен, limiter на FALLBACK_SECONDS переключается на
+    in-memory backend: лучше ограничивать в пределах процесса, чем уронить публикацию.
+    """
+
+    FALLBACK_SECONDS = 30
+
+    def __init__(
+        self,
+        limits: Dict[str, Tuple[float, float]],
+        backend=None,
+    ):
+        self.limits = limits
+        self.backend = backend or InMemoryTokenBucketBackend()
+        self._fallback = InMemoryTokenBucketBackend()
+        self._fallback_until = 0.0
+
+    async def acquire(self, provider: str, endpoint: Optional[str] = None, tokens: float = 1) -> None:
+        buckets = [provider]
+        if endpoint:
+            buckets.append(f"{provider}:{endpoint}")
+
+        for bucket in buckets:
+            limit = self.limits.get(bucket)
+            if limit is None:
+                continue
+            rate, capacity = limit
+
+            while True:
+                wait = await self._take(bucket, rate, capacity, tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+
+    async def _take(self, bucket: str, rate: float, capacity: float, tokens: float) -> float:
+        if time.monotonic() >= self._fallback_until:
+            try:
+                return await self.backend.take(bucket, rate, capacity, tokens)
+            except Exception as e:
+                logger.warning("Rate limiter backend failed, using in-memory buckets: %s", e)
+                self._fallback_until = time.monotonic() + self.FALLBACK_SECONDS
+
+        return await self._fallback.take(bucket, rate, capacity, tokens)
+
+
+def _build_default_limiter() -> RateLimiter:
+    if RATE_LIMIT_BACKEND == "memory":
+        backend = InMemoryTokenBucketBackend()
+    elif RATE_LIMIT_BACKEND == "redis":
+        backend = RedisTokenBucketBackend()
+    else:
+        raise ValueError(f"Unsupported RATE_LIMIT_BACKEND: {RATE_LIMIT_BACKEND}")
+
+    return RateLimiter(parse_rate_limits(RATE_LIMITS), backend=backend)
+
+
+rate_limiter = _build_default_limiter()
+
+
+async def rate_limit(provider: str, endpoint: Optional[str] = None) -> None:
+    """
+    Дождаться разрешения на вызов провайдера (общий limiter процесса).
+    """
+    await rate_limiter.acquire(provider, endpoint)
@@ -0,0 +1,19 @@
+import os
+from typing import Optional
+
+import redis.asyncio as redis
+
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+
+_client: Optional[redis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Общий async-клиент Redis процесса (события, rate limiter, кэши).
+    """
+    global _client
+    if _client is None:
+        _client = redis.from_url(REDIS_URL, decode_responses=True)
+    return _client
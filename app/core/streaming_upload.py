@@ -0,0 +1,187 @@
+import os
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiohttp
+from aiohttp.payload import Payload
+
+from app.core.blob_store import blob_path, open_blob
+
+
+logger = logging.getLogger(__name__)
+
+
+# =========================
+# Конфигурация
+# =========================
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", "65536"))     # байт на чанк
+UPLOAD_TIMEOUT = float(os.getenv("UPLOAD_TIMEOUT", "120"))           # секунды на загрузку
+
+_stats: Dict[str, int] = {
+    "uploads": 0,
+    "bytes": 0,
+    "peak_buffer_bytes": 0,   # максимум байт, удерживаемых одной загрузкой
+    "in_flight": 0,
+}
+
+
+# =========================
+# Источники чанков
+# =========================
+
+async def blob_chunks(digest: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Чанки блоба из blob store через mmap. В памяти — не больше одного чанка.
+    """
+
+    with open_blob(digest) as view:
+        for start in range(0, len(view), chunk_size):
+            yield bytes(view[start:start + chunk_size])
+            # Отдаём управление loop между чанками большого файла
+            await asyncio.sleep(0)
+
+
+async def response_chunks(
+    response: aiohttp.ClientResponse,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> AsyncIterator[bytes]:
+    """
+    Чанки тела ответа по мере прихода из сокета.
+    """
+
+    async for chunk in response.content.iter_chunked(chunk_size):
+        yield chunk
+
+
+# =========================
+# Multipart payload
+# =========================
+
+class StreamingPayload(Payload):
+    """
+    Поле multipart, которое пишет тело из асинхронного источника чанков.
+
+    Если размер известен (файл на диске, Content-Length источника),
+    у всего multipart-запроса будет Content-Length; иначе aiohttp
+    отправит его chunked. Пиковый удерживаемый объём — один чанк,
+    независимо от размера изображения; он попадает в upload_stats().
+    """
+
+    def __init__(
+        self,
+        source: AsyncIterator[bytes],
+        size: Optional[int] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(source, **kwargs)
+        self._size = size
+        self.bytes_sent = 0
+        self.peak_buffer_bytes = 0
+
+    async def write(self, writer: Any) -> None:
+        async for chunk in self._value:
+            self.peak_buffer_bytes = max(self.peak_buffer_bytes, len(chunk))
+            self.bytes_sent += len(chunk)
+            await writer.write(chunk)
+
+    def decode(self, encoding: str = "utf-8", errors: str = "strict") -> str:
+        raise TypeError("Streaming payload cannot be decoded")
+
+
+async def upload_multipart(
+    session_http: aiohttp.ClientSession,
+    url: str,
+    field: str,
+    source: AsyncIterator[bytes],
+    size: Optional[int],
+    filename: str,
+    content_type: str = "image/jpeg",
+) -> Dict[str, Any]:
+    """
+    POST multipart/form-data с одним файловым полем, тело — потоком из source.
+    Возвращает JSON ответа.
+    """
+
+    payload = StreamingPayload(source, size=size, content_type=content_type)
+
+    form = aiohttp.FormData()
+    form.add_field(field, payload, filename=filename, content_type=content_type)
+
+    _stats["in_flight"] += 1
+    try:
+        async with session_http.post(
+            url, data=form, timeout=aiohttp.ClientTimeout(total=UPLOAD_TIMEOUT)
+        ) as response:
+            result = await response.json(content_type=None)
+    finally:
+        _stats["in_flight"] -= 1
+
+    _stats["uploads"] += 1
+    _stats["bytes"] += payload.bytes_sent
+    _stats["peak_buffer_bytes"] = max(_stats["peak_buffer_bytes"], payload.peak_buffer_bytes)
+
+    logger.debug(
+        "Streaming upload: %s bytes, peak buffer %s bytes",
+        payload.bytes_sent,
+        payload.peak_buffer_bytes,
+    )
+    return result
+
+
+async def upload_blob(
+    session_http: aiohttp.ClientSession,
+    url: str,
+    field: str,
+    digest: str,
+    filename: str,
+    content_type: str = "image/jpeg",
+) -> Dict[str, Any]:
+    """
+    Загрузка блоба из blob store (размер известен — запрос с Content-Length).
+    """
+
+    return await upload_multipart(
+        session_http,
+        url,
+        field,
+        blob_chunks(digest),
+        size=os.path.getsize(blob_path(digest)),
+        filename=filename,
+        content_type=content_type,
+    )
+
+
+async def upload_from_url(
+    session_http: aiohttp.ClientSession,
+    url: str,
+    field: str,
+    source_url: str,
+    filename: str,
+) -> Dict[str, Any]:
+    """
+    Перекачка: тело ответа source_url сразу уходит в multipart-запрос на url,
+    без промежуточной копии изображения в памяти.
+    """
+
+    async with session_http.get(
+        source_url, timeout=aiohttp.ClientTimeout(total=UPLOAD_TIMEOUT)
+    ) as source:
+        source.raise_for_status()
+        return await upload_multipart(
+            session_http,
+            url,
+            field,
+            response_chunks(source),
+            size=source.content_length,
+            filename=filename,
+            content_type=source.content_type or "application/octet-stream",
+        )
+
+
+def upload_stats() -> Dict[str, int]:
+    """
+    Счётчики потоковых загрузок, включая пиковый буфер одной загрузки.
+    """
+    return dict(_stats)
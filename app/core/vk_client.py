@@ -0,0 +1,152 @@
+import os
+import json
+import logging
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+from app.core.adaptive_limiter import ProviderOverloaded, provider_call
+from app.core.http_client import get_http_session
+
+
+logger = logging.getLogger(__name__)
+
+
+# =========================
+# Конфигурация
+# =========================
+
+# Переопределяется, чтобы направить клиент на локальный фейковый сервер VK
+VK_API_URL = os.getenv("VK_API_URL", "https://api.vk.com/method")
+VK_API_VERSION = os.getenv("VK_API_VERSION", "5.131")
+
+# execute принимает не больше 25 обращений к API за вызов
+VK_EXECUTE_LIMIT = 25
+
+# Коды ошибок VK о превышении частоты запросов:
+# 6 — too many requests per second, 9 — flood control, 29 — rate limit reached
+VK_RATE_LIMIT_ERRORS = {6, 9, 29}
+
+
+class VKError(RuntimeError):
+    """
+    Ошибка метода VK API (в том числе одного вызова внутри execute).
+    """
+
+    def __init__(self, method: str, error: Dict[str, Any]):
+        self.method = method
+        self.code = error.get("error_code")
+        self.error = error
+        super().__init__(f"VK {method} error: {error}")
+
+
+def _raise_for_error(method: str, error: Dict[str, Any]) -> None:
+    if error.get("error_code") in VK_RATE_LIMIT_ERRORS:
+        raise ProviderOverloaded(f"VK {method} error: {error}")
+    raise VKError(method, error)
+
+
+def _as_exception(method: str, error: Dict[str, Any]) -> Exception:
+    try:
+        _raise_for_error(method, error)
+    except Exception as e:
+        return e
+    raise AssertionError("unreachable")
+
+
+def _build_execute_code(calls: Sequence[Tuple[str, Dict[str, Any]]]) -> str:
+    """
+    VKScript: return [API.photos.saveWallPhoto({...}), API.wall.post({...})];
+    Параметры сериализуются как JSON-литералы (VKScript их понимает).
+    """
+
+    body = ",".join(
+        f"API.{method}({json.dumps(params, ensure_ascii=False)})"
+        for method, params in calls
+    )
+    return f"return [{body}];"
+
+
+# =========================
+# Клиент
+# =========================
+
+class VKClient:
+    """
+    Клиент VK API поверх общего aiohttp-пула.
+
+    - call() — один метод, один запрос
+    - execute() — до 25 методов одним запросом через execute;
+      результат — список по вызовам: значение или исключение
+      (VKError / ProviderOverloaded) для каждого отдельно
+    """
+
+    def __init__(
+        self,
+        access_token: str,
+        api_url: str = VK_API_URL,
+        version: str = VK_API_VERSION,
+    ):
+        self.access_token = access_token
+        self.api_url = api_url.rstrip("/")
+        self.version = version
+        self.requests = 0
+        self.calls = 0
+
+    async def _request(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        session = get_http_session()
+        async with provider_call("vk", method):
+            async with session.post(
+                f"{self.api_url}/{method}",
+                data={**params, "access_token": self.access_token, "v": self.version},
+            ) as resp:
+                data = await resp.json(content_type=None)
+
+            # Ошибка всего запроса (в т.ч. execute целиком) — перегрузку видит AIMD
+            if "error" in data:
+                _raise_for_error(method, data["error"])
+
+        self.requests += 1
+        return data
+
+    async def call(self, method: str, params: Dict[str, Any]) -> Any:
+        """
+        Один метод VK API. Возвращает поле "response".
+        """
+
+        data = await self._request(method, params)
+        self.calls += 1
+        return data["response"]
+
+    async def execute(
+        self,
+        calls: Sequence[Tuple[str, Dict[str, Any]]],
+    ) -> List[Union[Any, Exception]]:
+        """
+        Выполняет вызовы пачками по VK_EXECUTE_LIMIT через метод execute.
+
+        Неудачный вызов внутри execute возвращает false, а описание ошибки
+        попадает в execute_errors в том же порядке — так ошибки
+        сопоставляются вызовам.
+        """
+
+        results: List[Union[Any, Exception]] = []
+        for start in range(0, len(calls), VK_EXECUTE_LIMIT):
+            chunk = calls[start:start + VK_EXECUTE_LIMIT]
+            data = await self._request("execute", {"code": _build_execute_code(chunk)})
+            self.calls += len(chunk)
+
+            response = data.get("response") or []
+            errors = iter(data.get("execute_errors") or [])
+
+            for index, (method, _) in enumerate(chunk):
+                value = response[index] if index < len(response) else False
+                if value is False:
+                    error = next(errors, None) or {"error_msg": "No result from execute"}
+                    results.append(_as_exception(method, error))
+                else:
+                    results.append(value)
+
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        return {"requests": self.requests, "calls": self.calls}
+
@@ -0,0 +1,246 @@
+import json
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import func, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import ContentItem
+
+
+# Имена стадий pipeline
+STAGE_ARTICLE = "article"
+STAGE_IMAGES = "images"
+STAGE_TELEGRAM = "telegram"
+STAGE_VK = "vk"
+
+# Ключ прогресса стадии внутри stage_checkpoints: "<stage>:progress"
+PROGRESS_SUFFIX = ":progress"
+
+
+def stage_hash(value: Any) -> str:
+    """
+    Стабильный sha256 от результата стадии (строка, список, dict).
+    """
+    raw = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# Получить чекпоинт стадии
+def get_stage_checkpoint(
+    content_item: ContentItem,
+    stage: str,
+) -> Optional[Dict[str, Any]]:
+    return (content_item.stage_checkpoints or {}).get(stage)
+
+
+# Стадия уже выполнена?
+def is_stage_done(
+    content_item: ContentItem,
+    stage: str,
+    input_hash: Optional[str] = None,
+) -> bool:
+    """
+    Стадия считается выполненной, если есть чекпоинт и (когда передан
+    input_hash) он построен по тем же входным данным — например, изображения
+    по текущему тексту статьи, а не по предыдущей версии.
+    """
+
+    checkpoint = get_stage_checkpoint(content_item, stage)
+    if not checkpoint:
+        return False
+
+    if input_hash is not None and checkpoint.get("input_hash") != input_hash:
+        return False
+
+    return True
+
+
+# Статья готова для следующих стадий?
+def is_article_done(content_item: ContentItem) -> bool:
+    """
+    Непустой text ещё не значит готовую статью: при потоковой генерации
+    туда пишется частичный текст. Готова та статья, на которой стадия
+    article поставила чекпоинт, — хэш чекпоинта совпадает с text.
+    """
+
+    if not content_item.text:
+        return False
+
+    checkpoint = get_stage_checkpoint(content_item, STAGE_ARTICLE)
+    return bool(checkpoint) and checkpoint.get("hash") == stage_hash(content_item.text)
+
+
+# Новый словарь чекпоинтов с отметкой о стадии
+def with_stage_checkpoint(
+    content_item: ContentItem,
+    stage: str,
+    output: Any,
+    input_hash: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Возвращает новый dict для поля stage_checkpoints.
+
+    Новый объект, а не мутация старого: иначе SQLAlchemy не заметит
+    изменения JSON-колонки. Сохраняется вызывающим кодом, например:
+
+        await update_content_item(
+            session,
+            content_item_id,
+            text=text,
+            stage_checkpoints=with_stage_checkpoint(content_item, "article", text),
+        )
+    """
+
+    checkpoints = dict(content_item.stage_checkpoints or {})
+    checkpoints[stage] = _make_checkpoint(output, input_hash)
+    return checkpoints
+
+
+def _make_checkpoint(output: Any, input_hash: Optional[str] = None) -> Dict[str, Any]:
+    checkpoint = {
+        "hash": stage_hash(output),
+        "completed_at": datetime.utcnow().isoformat(),
+    }
+    if input_hash is not None:
+        checkpoint["input_hash"] = input_hash
+    return checkpoint
+
+
+# Атомарно сохранить чекпоинт стадии и поля результата
+async def save_stage_checkpoint(
+    session: AsyncSession,
+    content_item_id: int,
+    stage: str,
+    output: Any,
+    input_hash: Optional[str] = None,
+    **fields: Any,
+) -> None:
+    """
+    Как update_content_item(..., stage_checkpoints=with_stage_checkpoint(...)),
+    но ключ стадии дописывается в актуальный словарь атомарно. Нужен,
+    когда стадии одного элемента выполняются параллельно — например,
+    публикация в несколько каналов: иначе каждая запишет свою копию
+    словаря и затрёт чекпоинт соседней.
+
+    - PostgreSQL: чтение строки под блокировкой (FOR UPDATE) и запись
+    - SQLite: один UPDATE ... SET stage_checkpoints = json_set(...).
+      Отдельный SELECT здесь не помог бы: отложенная транзакция SQLite
+      читает без блокировки записи, и два издателя прочитали бы один
+      и тот же словарь
+    """
+
+    await _save_checkpoint_key(
+        session, content_item_id, stage, _make_checkpoint(output, input_hash), **fields
+    )
+
+
+# =========================
+# Прогресс многошаговой стадии
+# =========================
+
+# Уже выполненные шаги стадии
+def get_stage_progress(
+    content_item: ContentItem,
+    stage: str,
+    input_hash: str,
+) -> List[str]:
+    """
+    Шаги, отмеченные save_stage_progress для тех же входных данных.
+    Прогресс по другой версии контента не считается.
+    """
+
+    progress = get_stage_checkpoint(content_item, stage + PROGRESS_SUFFIX)
+    if not progress or progress.get("input_hash") != input_hash:
+        return []
+    return list(progress.get("steps") or [])
+
+
+# Атомарно отметить выполненные шаги стадии
+async def save_stage_progress(
+    session: AsyncSession,
+    content_item_id: int,
+    stage: str,
+    input_hash: str,
+    steps: Iterable[str],
+    **fields: Any,
+) -> None:
+    """
+    Сохраняет список выполненных шагов стадии (например, отправленных
+    частей поста) вместе с полями результата. Повтор стадии после сбоя
+    выполнит только недостающие шаги.
+    """
+
+    await _save_checkpoint_key(
+        session,
+        content_item_id,
+        stage + PROGRESS_SUFFIX,
+        {"input_hash": input_hash, "steps": list(steps)},
+        **fields,
+    )
+
+
+async def _save_checkpoint_key(
+    session: AsyncSession,
+    content_item_id: int,
+    key: str,
+    checkpoint: Dict[str, Any],
+    **fields: Any,
+) -> None:
+    if session.bind.dialect.name == "sqlite":
+        await _merge_checkpoint_key(session, content_item_id, key, checkpoint, **fields)
+        return
+
+    result = await session.execute(
+        select(ContentItem)
+        .where(ContentItem.id == content_item_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    content_item = result.scalar_one_or_none()
+    if content_item is None:
+        return
+
+    for field, value in fields.items():
+        if hasattr(content_item, field):
+            setattr(content_item, field, value)
+
+    checkpoints = dict(content_item.stage_checkpoints or {})
+    checkpoints[key] = checkpoint
+    content_item.stage_checkpoints = checkpoints
+    await session.commit()
+
+
+async def _merge_checkpoint_key(
+    session: AsyncSession,
+    content_item_id: int,
+    key: str,
+    checkpoint: Dict[str, Any],
+    **fields: Any,
+) -> None:
+    """
+    Слияние одним оператором: SQLite берёт блокировку записи на UPDATE
+    и вычисляет json_set от текущего значения колонки.
+    """
+
+    values = {
+        field: value for field, value in fields.items() if hasattr(ContentItem, field)
+    }
+    # Пустая колонка — NULL или JSON null (так JSON-тип сохраняет None)
+    current = func.coalesce(
+        func.nullif(ContentItem.stage_checkpoints, literal("null")), literal("{}")
+    )
+    values["stage_checkpoints"] = func.json_set(
+        current,
+        literal(f'$."{key}"'),
+        func.json(literal(json.dumps(checkpoint, ensure_ascii=False))),
+    )
+
+    await session.execute(
+        update(ContentItem)
+        .where(ContentItem.id == content_item_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
@@ -0,0 +1,249 @@
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Union
+
+from sqlalchemy import case, func, select, update, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import ContentItem
+from app.db.session import async_session_factory
+
+
+DEFAULT_LEASE_SECONDS = int(os.getenv("CONTENT_LEASE_SECONDS", "1800"))
+MAX_ATTEMPTS = int(os.getenv("CONTENT_MAX_ATTEMPTS", "3"))
+
+# Статусы незавершённых элементов: draft — до статьи, ready — статья есть,
+# но изображения / публикация ещё не прошли. Конечные статусы: published
+# и error (MAX_ATTEMPTS неудачных прогонов подряд) — их сверка не берёт
+CLAIMABLE_STATUSES = ("draft", "ready")
+ERROR_STATUS = "error"
+
+
+def default_lease_owner() -> str:
+    """
+    Идентификатор текущего процесса для поля lease_owner.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _status_condition(status: Union[str, Sequence[str]]):
+    if isinstance(status, str):
+        return ContentItem.status == status
+    return ContentItem.status.in_(list(status))
+
+
+def _claimable(now: datetime):
+    # Свободен, если lease никогда не брали или он истёк (упавший процесс)
+    return or_(
+        ContentItem.lease_expires_at.is_(None),
+        ContentItem.lease_expires_at < now,
+    )
+
+
+# Захватить до limit элементов с указанным статусом (или одним из статусов)
+async def claim_content_items(
+    owner: str,
+    limit: int,
+    status: Union[str, Sequence[str]] = CLAIMABLE_STATUSES,
+    lease_seconds: int = DEFAULT_LEASE_SECONDS,
+    after_id: Optional[int] = None,
+) -> List[int]:
+    """
+    Атомарно захватывает свободные content_items и возвращает их ID
+    (по возрастанию).
+
+    after_id — keyset-пагинация прохода: берутся только ID больше
+    последнего захваченного, уже пройденные элементы не возвращаются.
+
+    Postgres: SELECT ... FOR UPDATE SKIP LOCKED — параллельные
+    планировщики получают непересекающиеся наборы без ожидания.
+    SQLite: один UPDATE с подзапросом; SQLite сериализует запись,
+    поэтому UPDATE атомарен сам по себе.
+    """
+
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=lease_seconds)
+
+    async with async_session_factory() as session:  # type: AsyncSession
+        condition = _status_condition(status) & _claimable(now)
+        if after_id is not None:
+            condition = condition & (ContentItem.id > after_id)
+
+        if session.bind.dialect.name == "postgresql":
+            result = await session.execute(
+                select(ContentItem.id)
+                .where(condition)
+                .order_by(ContentItem.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            ids = list(result.scalars().all())
+
+            if ids:
+                await session.execute(
+                    update(ContentItem)
+                    .where(ContentItem.id.in_(ids))
+                    .values(lease_owner=owner, lease_expires_at=expires_at)
+                    .execution_options(synchronize_session=False)
+                )
+        else:
+            candidates = (
+                select(ContentItem.id)
+                .where(condition)
+                .order_by(ContentItem.id)
+                .limit(limit)
+                .scalar_subquery()
+            )
+            await session.execute(
+                update(ContentItem)
+                .where(ContentItem.id.in_(candidates))
+                .values(lease_owner=owner, lease_expires_at=expires_at)
+                .execution_options(synchronize_session=False)
+            )
+            # owner + expires_at однозначно определяют именно этот захват
+            result = await session.execute(
+                select(ContentItem.id)
+                .where(
+                    ContentItem.lease_owner == owner,
+                    ContentItem.lease_expires_at == expires_at,
+                )
+                .order_by(ContentItem.id)
+            )
+            ids = list(result.scalars().all())
+
+        await session.commit()
+        return ids
+
+
+# Захватить конкретный элемент (ручной запуск pipeline)
+async def claim_content_item(
+    content_item_id: int,
+    owner: str,
+    status: Optional[Union[str, Sequence[str]]] = None,
+    lease_seconds: int = DEFAULT_LEASE_SECONDS,
+) -> bool:
+    """
+    Захватывает один content_item (если status=None — независимо от статуса).
+
+    Возвращает False, если элемент не найден, в другом статусе
+    или уже захвачен — в том числе тем же owner: повторное событие
+    не должно запустить элемент второй раз.
+    """
+
+    now = datetime.utcnow()
+
+    async with async_session_factory() as session:  # type: AsyncSession
+        query = update(ContentItem).where(
+            ContentItem.id == content_item_id,
+            _claimable(now),
+        )
+        if status is not None:
+            query = query.where(_status_condition(status))
+
+        result = await session.execute(
+            query
+            .values(
+                lease_owner=owner,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return result.rowcount == 1
+
+
+# Продлить свой lease (между стадиями)
+async def renew_content_item_lease(
+    content_item_id: int,
+    owner: str,
+    lease_seconds: int = DEFAULT_LEASE_SECONDS,
+) -> bool:
+    """
+    Продлевает lease, только если он всё ещё принадлежит owner.
+
+    Вызывается перед каждой стадией: долгий элемент не должен потерять
+    lease посреди pipeline. False — lease перехвачен другим владельцем
+    (истёк и был захвачен заново), продолжать обработку нельзя.
+    """
+
+    async with async_session_factory() as session:  # type: AsyncSession
+        result = await session.execute(
+            update(ContentItem)
+            .where(
+                ContentItem.id == content_item_id,
+                ContentItem.lease_owner == owner,
+            )
+            .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds))
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return result.rowcount == 1
+
+
+# Освободить lease после обработки
+async def release_content_item(
+    content_item_id: int,
+    owner: Optional[str] = None,
+) -> None:
+    """
+    Снимает lease. Если указан owner — только свой, чужой не трогаем.
+    """
+
+    async with async_session_factory() as session:  # type: AsyncSession
+        query = update(ContentItem).where(ContentItem.id == content_item_id)
+        if owner is not None:
+            query = query.where(ContentItem.lease_owner == owner)
+
+        await session.execute(
+            query.values(lease_owner=None, lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+
+# Освободить lease после неудачного прогона
+async def release_failed_content_item(
+    content_item_id: int,
+    owner: Optional[str] = None,
+    max_attempts: int = MAX_ATTEMPTS,
+) -> bool:
+    """
+    Снимает lease и засчитывает неудачную попытку. На max_attempts-й
+    элемент получает статус error и больше не захватывается: иначе
+    стабильно падающий элемент (QA ниже порога, оборванный поток)
+    тратил бы вызовы LLM и генерации изображений на каждой сверке.
+
+    Если указан owner — только свой lease. Возвращает True, если
+    элемент (теперь) в статусе error.
+    """
+
+    attempts = func.coalesce(ContentItem.failed_attempts, 0) + 1
+
+    async with async_session_factory() as session:  # type: AsyncSession
+        query = update(ContentItem).where(ContentItem.id == content_item_id)
+        if owner is not None:
+            query = query.where(ContentItem.lease_owner == owner)
+
+        # Правые части SET считаются по старым значениям строки
+        await session.execute(
+            query.values(
+                failed_attempts=attempts,
+                status=case(
+                    (
+                        ContentItem.status.in_(CLAIMABLE_STATUSES) & (attempts >= max_attempts),
+                        ERROR_STATUS,
+                    ),
+                    else_=ContentItem.status,
+                ),
+                lease_owner=None,
+                lease_expires_at=None,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+        result = await session.execute(
+            select(ContentItem.status).where(ContentItem.id == content_item_id)
+        )
+        return result.scalar_one_or_none() == ERROR_STATUS
@@ -9,12 +9,27 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     Index,
+    JSON,
 )
 from sqlalchemy.orm import relationship
 
 from app.db.base import Base
 
 
+# ==========================================================
+# Проект (та же таблица, что и app.models.Project)
+# ==========================================================
+class Project(Base):
+    __tablename__ = "projects"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+
+    # Каналы публикации: enable_<канал> (см. worker.tasks_publish)
+    enable_telegram = Column(Boolean, default=True)
+    enable_vk = Column(Boolean, default=True)
+
+
 # ==========================================================
 # Модель контента
 # ==========================================================
@@ -23,10 +38,22 @@ class ContentItem(Base):
 
     id = Column(Integer, primary_key=True, index=True)
 
+    project_id = Column(Integer, nullable=True, index=True)
+
     title = Column(String(255), nullable=False)
     body = Column(Text, nullable=True)
 
-    # draft / published / error
+    # Результаты генерации (те же колонки, что и в app.models.ContentItem)
+    text = Column(Text, default="")
+    image_style = Column(String(255), default="")
+    image_count = Column(Integer, default=1)
+    images = Column(JSON, default=list)
+
+    # Локальные копии изображений (app.core.blob_store), по одной на элемент images:
+    # [{"url": ..., "sha256": ..., "variants": {"telegram": sha256, "vk": sha256}}]
+    image_blobs = Column(JSON, default=list)
+
+    # draft / ready / published / error
     status = Column(String(50), default="draft", index=True)
 
     created_at = Column(
@@ -43,8 +70,20 @@ class ContentItem(Base):
     )
 
     telegram_posted = Column(Boolean, default=False, nullable=False)
+    # Ключ изображения (sha256 блоба или URL) -> Telegram file_id для повторной отправки
+    telegram_file_ids = Column(JSON, default=dict)
     vk_posted = Column(Boolean, default=False, nullable=False)
 
+    # Чекпоинты стадий pipeline:
+    # {"article": {"hash": ..., "completed_at": ...}, "images": {...}, ...}
+    stage_checkpoints = Column(JSON, default=dict)
+
+    # Lease: какой процесс сейчас обрабатывает элемент и до какого момента
+    lease_owner = Column(String(255), nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    # Неудачные прогоны pipeline; после CONTENT_MAX_ATTEMPTS — статус error
+    failed_attempts = Column(Integer, default=0, nullable=False)
+
     # Связь с логами ошибок
     error_logs = relationship(
     "ErrorLog",
@@ -55,6 +94,7 @@ class ContentItem(Base):
 
     __table_args__ = (
         Index("ix_content_status", "status"),
+        Index("ix_content_status_lease", "status", "lease_expires_at"),
     )
 
 
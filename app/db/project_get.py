@@ -0,0 +1,20 @@
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Project
+
+
+# Получить проект по ID
+async def get_project_by_id(
+    session: AsyncSession,
+    project_id: Optional[int],
+) -> Optional[Project]:
+    if project_id is None:
+        return None
+
+    result = await session.execute(
+        select(Project).where(Project.id == project_id)
+    )
+    return result.scalar_one_or_none()
@@ -1,3 +1,6 @@
+import uuid
+import logging
+
 from fastapi import FastAPI, Request, Form, Depends, HTTPException
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
@@ -7,12 +10,15 @@ from sqlalchemy import update, delete
 from passlib.context import CryptContext
 from datetime import datetime
 from app.db.session import async_session_factory
+from app.db.content_item_claim import claim_content_item, release_content_item
+from app.core.events import publish_content_created
 from app.models import User, Project, ContentItem, ErrorLog
 from worker.celery_app import celery_full_pipeline
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 app = FastAPI()
 templates = Jinja2Templates(directory="app/templates")
+logger = logging.getLogger(__name__)
 
 
 # ---------------------------
@@ -160,6 +166,11 @@ async def add_content(project_id: int, title: str = Form(...), image_style: str
     content_item = ContentItem(project_id=project_id, title=title, image_style=image_style, image_count=image_count, status="draft")
     session.add(content_item)
     await session.commit()
+    try:
+        # Планировщик подхватит элемент сразу, не дожидаясь сверки
+        await publish_content_created(content_item.id)
+    except Exception:
+        logger.exception("Failed to publish content_created event (content_item_id=%s)", content_item.id)
     return RedirectResponse(f"/projects/{project_id}/content", status_code=303)
 
 
@@ -216,5 +227,17 @@ async def qa_logs(request: Request, content_id: int, session: AsyncSession = Dep
 # ---------------------------
 @app.post("/content/{content_id}/run_pipeline")
 async def run_pipeline(content_id: int):
-    celery_full_pipeline.delay(content_item_id=content_id)
+    # Lease не даст планировщику (и повторному нажатию) взять этот же элемент,
+    # пока идёт ручной запуск. Владелец уникален для запуска — chain
+    # продлевает lease между стадиями и снимает его в конце или при ошибке
+    owner = f"manual:{uuid.uuid4().hex}"
+    if not await claim_content_item(content_id, owner=owner):
+        return {"message": "Pipeline уже выполняется"}
+    try:
+        celery_full_pipeline.delay(content_item_id=content_id, lease_owner=owner)
+    except Exception:
+        # Брокер недоступен: chain не запущен, и снять lease больше некому
+        logger.exception("Failed to enqueue pipeline (content_item_id=%s)", content_id)
+        await release_content_item(content_id, owner=owner)
+        raise HTTPException(status_code=503, detail="Очередь задач недоступна, повторите позже")
     return {"message": "Pipeline запущен"}
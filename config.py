@@ -15,6 +15,8 @@ class Settings(BaseSettings):
     # =========================
     VK_ACCESS_TOKEN: str
     VK_GROUP_ID: int
+    VK_API_URL: str = "https://api.vk.com/method"   # можно направить на локальный фейковый сервер
+    VK_API_VERSION: str = "5.131"
 
     # =========================
     # OpenAI / AI генерация
@@ -23,11 +25,42 @@ class Settings(BaseSettings):
     OPENAI_IMAGE_MODEL: str = "gpt-image-1"
     OPENAI_QA_MODEL: str = "gpt-4o-mini"
 
+    # =========================
+    # Генерация статей
+    # =========================
+    ARTICLE_TIMEOUT: float = 120          # секунды на completion
+    ARTICLE_MAX_RETRIES: int = 2
+    ARTICLE_CONCURRENCY: int = 8          # одновременных генераций на процесс
+    ARTICLE_MAX_CONNECTIONS: int = 20
+    ARTICLE_KEEPALIVE_SECONDS: float = 60
+    GENERATION_CACHE_MODE: str = "reuse"      # reuse | refresh | off (статьи и изображения)
+    ARTICLE_CACHE_MODE: str = "reuse"
+    ARTICLE_CACHE_TTL: int = 604800           # секунды
+    ARTICLE_CACHE_MAX_ITEMS: int = 500        # LRU в памяти процесса
+    ARTICLE_CACHE_REDIS_MAX_ITEMS: int = 20000  # вытеснение в Redis по последнему обращению
+    ARTICLE_STREAMING: bool = True        # потоковая генерация с промежуточным сохранением
+    ARTICLE_STREAM_FLUSH_CHARS: int = 500
+    ARTICLE_STREAM_FLUSH_SECONDS: float = 3
+
     # =========================
     # QA агент
     # =========================
     QA_PROVIDER: str = "openai"       # openai | stub
     QA_TIMEOUT: int = 90              # секунда
+    QA_CACHE_ENABLED: bool = True
+    QA_CACHE_TTL: int = 86400         # секунды
+    QA_CACHE_MAX_ITEMS: int = 2000    # LRU в памяти процесса
+    QA_CACHE_REDIS: bool = True       # второй уровень, общий для воркеров
+    QA_BATCH_ENABLED: bool = True     # склеивать одновременные проверки статей
+    QA_BATCH_SIZE: int = 5            # статей в одном вызове модели
+    QA_BATCH_WINDOW_MS: int = 50      # окно сбора пакета
+    QA_HEURISTICS_ENABLED: bool = True  # локальный pre-filter перед LLM
+    QA_HEURISTIC_PASS: float = 9.5    # >= — проходит без LLM
+    QA_HEURISTIC_FAIL: float = 3.0    # <= — бракуется без LLM
+    QA_TARGET_LENGTH: int = 3000      # ожидаемая длина статьи, символов
+    QA_STREAM_MAX_LENGTH_FACTOR: float = 3    # обрыв потока: текст длиннее цели в N раз
+    QA_STREAM_LOOP_WINDOW: int = 200          # обрыв потока: окно проверки зацикливания, слов
+    QA_STREAM_LOOP_THRESHOLD: float = 0.5     # доля повторных триграмм в окне
 
     # =========================
     # Генерация изображений
@@ -35,6 +68,19 @@ class Settings(BaseSettings):
     IMAGE_PROVIDER: str = "openai"    # openai | stub
     IMAGE_SIZE: str = "1024x1024"
     IMAGE_QUALITY: str = "standard"
+    IMAGE_TIMEOUT: float = 90                 # дедлайн одного изображения, секунды
+    IMAGE_RETRY_ROUNDS: int = 1               # повторы только недостающих изображений
+    IMAGE_MIN_COUNT: int = 1                  # минимум изображений для успеха стадии
+    BLOB_STORE_DIR: str = "data/blobs"        # content-addressed копии изображений
+    BLOB_DOWNLOAD_TIMEOUT: float = 60
+    BLOB_PROCESS_WORKERS: int = 2             # процессы ресайза; 0 — потоки
+    UPLOAD_CHUNK_SIZE: int = 65536            # потоковая загрузка фото: байт на чанк
+    UPLOAD_TIMEOUT: float = 120
+    IMAGE_VARIANTS: str = "telegram=1280:87,vk=1600:90"   # платформа=сторона:качество
+    IMAGE_CACHE_MODE: str = "reuse"
+    IMAGE_CACHE_TTL: int = 3000               # меньше времени жизни URL OpenAI (~1 час)
+    IMAGE_CACHE_MAX_ITEMS: int = 500
+    IMAGE_CACHE_REDIS_MAX_ITEMS: int = 5000
 
     # =========================
     # Celery / Worker / Redis
@@ -42,10 +88,73 @@ class Settings(BaseSettings):
     REDIS_URL: str
     REDIS_BACKEND: str
 
+    CELERY_GENERATION_QUEUE: str = "generation"
+    CELERY_GENERATION_CONCURRENCY: int = 2     # prefork-процессов
+    CELERY_PUBLISHING_QUEUE: str = "publishing"
+    CELERY_PUBLISHING_CONCURRENCY: int = 32    # потоков пула threads, общий event loop
+
+    # =========================
+    # Retry стадий Celery pipeline
+    # (<STAGE>_MAX_RETRIES / _RETRY_BACKOFF / _RETRY_BACKOFF_MAX, секунды)
+    # =========================
+    GENERATE_ARTICLE_MAX_RETRIES: int = 2
+    GENERATE_ARTICLE_RETRY_BACKOFF: int = 60
+    GENERATE_ARTICLE_RETRY_BACKOFF_MAX: int = 600
+    GENERATE_IMAGE_MAX_RETRIES: int = 3
+    GENERATE_IMAGE_RETRY_BACKOFF: int = 60
+    GENERATE_IMAGE_RETRY_BACKOFF_MAX: int = 900
+    TELEGRAM_FILE_ID_CACHE_TTL: int = 2592000        # file_id переиспользуется между элементами
+    TELEGRAM_FILE_ID_CACHE_MAX_ITEMS: int = 5000
+    TELEGRAM_FLOOD_RETRIES: int = 3          # повторов вызова после flood wait
+    TELEGRAM_MAX_FLOOD_WAIT: float = 60      # дольше — отдаём ретрай Celery
+    PUBLISH_MAX_RETRIES: int = 5              # повтор затрагивает только неопубликованные каналы
+    PUBLISH_RETRY_BACKOFF: int = 15
+    PUBLISH_RETRY_BACKOFF_MAX: int = 600
+    PUBLISH_PLUGINS: str = ""                 # модули дополнительных каналов через запятую
+
+    # =========================
+    # Rate limiting внешних API (общий для кластера через Redis)
+    # "<provider>[:<endpoint>]=<токенов/сек>/<ёмкость>,..."
+    # =========================
+    RATE_LIMIT_BACKEND: str = "redis"  # redis | memory
+    RATE_LIMITS: str = (
+        "openai=5/10,openai:chat=4/8,openai:images=1/3,"
+        "telegram=25/30,telegram:sendMessage=1/3,telegram:sendPhoto=1/3,"
+        "telegram:sendMediaGroup=1/3,"
+        "vk=3/3"
+    )
+
+    # Общий пул HTTP-соединений (aiohttp) для агентов и издателей
+    HTTP_POOL_LIMIT: int = 100
+    HTTP_POOL_LIMIT_PER_HOST: int = 20
+    HTTP_DNS_CACHE_TTL: int = 300
+    HTTP_KEEPALIVE_TIMEOUT: float = 60
+
+    # Адаптивный (AIMD) лимит одновременных запросов к провайдеру
+    AIMD_INITIAL_LIMIT: float = 4
+    AIMD_MIN_LIMIT: float = 1
+    AIMD_MAX_LIMIT: float = 64
+    AIMD_INCREASE: float = 1           # аддитивный рост за окно успешных вызовов
+    AIMD_DECREASE: float = 0.5         # мультипликативное снижение на 429 / таймаут
+    AIMD_LATENCY_TARGET: float = 30    # сек, медленнее — лимит не растёт
+
     # =========================
     # Scheduler
     # =========================
-    SCHEDULER_INTERVAL_MINUTES: int = 60
+    SCHEDULER_INTERVAL_MINUTES: int = 60      # сверка-страховка, основной путь — события
+    SCHEDULER_EVENTS_GROUP: str = "scheduler"
+    SCHEDULER_EVENTS_BLOCK_MS: int = 5000
+    SCHEDULER_EVENTS_RETRY_SECONDS: int = 5
+    CONTENT_EVENTS_STREAM: str = "content_items:created"
+    CONTENT_EVENTS_MAXLEN: int = 10000
+    SCHEDULER_ARTICLE_CONCURRENCY: int = 5    # воркеров на стадию
+    SCHEDULER_IMAGE_CONCURRENCY: int = 3
+    SCHEDULER_PUBLISH_CONCURRENCY: int = 5    # все каналы элемента — параллельно
+    SCHEDULER_QUEUE_SIZE: int = 20            # размер очереди перед стадией (backpressure)
+    SCHEDULER_MONITOR_SECONDS: int = 30
+    SCHEDULER_CLAIM_BATCH_SIZE: int = 20
+    CONTENT_LEASE_SECONDS: int = 1800         # lease на обработку одного элемента
+    CONTENT_MAX_ATTEMPTS: int = 3             # неудачных прогонов до статуса error
 
     # =========================
     # Общие настройки
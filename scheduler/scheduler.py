@@ -1,46 +1,267 @@
+import os
+import time
 import asyncio
 from datetime import datetime
-from sqlalchemy import select
-from app.db.session import async_session_factory
-from app.db.models import ContentItem
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from app.agents.article_agent import article_cache_stats
+from app.agents.image_agent import image_cache_stats
+from app.agents.qa_agent import qa_cache_stats
+from app.agents.qa_heuristics import heuristic_stats
+from app.core.adaptive_limiter import current_limits
+from app.core.events import consume_content_created
+from app.core.http_client import close_http_session, pool_stats, start_http_session
+from app.core.streaming_upload import upload_stats
+from app.db.content_item_claim import (
+    claim_content_item,
+    claim_content_items,
+    default_lease_owner,
+    release_content_item,
+    release_failed_content_item,
+    renew_content_item_lease,
+)
 from worker.tasks_generate_article import generate_article_task
 from worker.tasks_generate_image import generate_image_task
-from worker.tasks_publish_telegram import publish_telegram_task
-from worker.tasks_publish_vk import publish_vk_task
+from worker.tasks_publish import publish_task
+from worker.tasks_publish_telegram import close_bot
 
-INTERVAL_MINUTES = 60  # проверка новых задач каждый час
+# Новые элементы приходят событиями; периодическая сверка — только страховка
+INTERVAL_MINUTES = int(os.getenv("SCHEDULER_INTERVAL_MINUTES", "60"))
 
-async def run_pipeline():
-    async with async_session_factory() as session:
-        # 1. Берём все draft content_items через SQLAlchemy select
-        result = await session.execute(
-            select(ContentItem.id).where(ContentItem.status == 'draft').order_by(ContentItem.id)
-        )
-        ids = result.scalars().all()
+# Redis stream consumer group: реплики планировщика делят события между собой
+EVENTS_GROUP = os.getenv("SCHEDULER_EVENTS_GROUP", "scheduler")
+EVENTS_BLOCK_MS = int(os.getenv("SCHEDULER_EVENTS_BLOCK_MS", "5000"))
+EVENTS_RETRY_SECONDS = int(os.getenv("SCHEDULER_EVENTS_RETRY_SECONDS", "5"))
+
+# Количество воркеров на каждую стадию (внешние API имеют разную пропускную способность)
+STAGE_WORKERS = {
+    "article": int(os.getenv("SCHEDULER_ARTICLE_CONCURRENCY", "5")),
+    "image": int(os.getenv("SCHEDULER_IMAGE_CONCURRENCY", "3")),
+    # Все каналы публикуются параллельно внутри одного элемента
+    "publish": int(os.getenv("SCHEDULER_PUBLISH_CONCURRENCY", "5")),
+}
+
+# Размер очереди перед каждой стадией — источник backpressure
+QUEUE_SIZE = int(os.getenv("SCHEDULER_QUEUE_SIZE", "20"))
+
+# Сколько незавершённых элементов захватывать за один запрос к БД
+CLAIM_BATCH_SIZE = int(os.getenv("SCHEDULER_CLAIM_BATCH_SIZE", "20"))
+
+# Как часто печатать глубину очередей во время прогона
+MONITOR_SECONDS = int(os.getenv("SCHEDULER_MONITOR_SECONDS", "30"))
+
+STAGES = (
+    ("article", generate_article_task),
+    ("image", generate_image_task),
+    ("publish", publish_task),
+)
+
+
+# =========================
+# Staged pipeline
+# =========================
+class StagedPipeline:
+    """
+    Конвейер из стадий, связанных ограниченными asyncio.Queue.
+
+    У каждой стадии свой пул воркеров, поэтому медленная генерация
+    изображений не держит издателей без работы. Когда очередь стадии
+    заполнена, предыдущая стадия ждёт на put() — это и есть backpressure.
+    Ошибка элемента на любой стадии снимает только этот элемент.
+
+    on_item_done(content_id, ok) вызывается, когда элемент покинул конвейер.
+    before_stage(content_id, stage) вызывается перед каждой стадией;
+    False — элемент снимается с конвейера (например, lease потерян).
+    """
 
-    for content_id in ids:
+    def __init__(
+        self,
+        stages=STAGES,
+        workers=None,
+        queue_size: int = QUEUE_SIZE,
+        on_item_done: Optional[Callable[[int, bool], Awaitable[None]]] = None,
+        before_stage: Optional[Callable[[int, str], Awaitable[bool]]] = None,
+    ):
+        self.stages = stages
+        self.workers = workers or STAGE_WORKERS
+        self.on_item_done = on_item_done
+        self.before_stage = before_stage
+        self.queues: Dict[str, asyncio.Queue] = {
+            name: asyncio.Queue(maxsize=queue_size) for name, _ in stages
+        }
+        self.processed = 0
+        self.failed = 0
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        for index, (name, task) in enumerate(self.stages):
+            next_queue = None
+            if index + 1 < len(self.stages):
+                next_queue = self.queues[self.stages[index + 1][0]]
+
+            for _ in range(self.workers.get(name, 1)):
+                self._tasks.append(
+                    asyncio.create_task(self._worker(name, task, next_queue))
+                )
+
+    async def submit(self, content_id: int) -> None:
+        await self.queues[self.stages[0][0]].put(content_id)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {name: queue.qsize() for name, queue in self.queues.items()}
+
+    async def _worker(self, name, task, next_queue) -> None:
+        queue = self.queues[name]
+        while True:
+            content_id = await queue.get()
+            try:
+                if self.before_stage is not None and not await self.before_stage(content_id, name):
+                    raise RuntimeError("lease lost")
+                await task(content_id)
+            except Exception as e:
+                self.failed += 1
+                print(f"[Pipeline] Error stage={name} content_id={content_id}: {e}")
+                await self._item_done(content_id, False)
+            else:
+                if next_queue is not None:
+                    await next_queue.put(content_id)
+                else:
+                    self.processed += 1
+                    await self._item_done(content_id, True)
+            finally:
+                queue.task_done()
+
+    async def _item_done(self, content_id: int, ok: bool) -> None:
+        if self.on_item_done is None:
+            return
         try:
-            # 2. Генерация статьи
-            await generate_article_task(content_id)
+            await self.on_item_done(content_id, ok)
+        except Exception as e:
+            print(f"[Pipeline] on_item_done failed content_id={content_id}: {e}")
+
 
-            # 3. Генерация изображений
-            await generate_image_task(content_id)
+async def _monitor(pipeline: StagedPipeline) -> None:
+    while True:
+        await asyncio.sleep(MONITOR_SECONDS)
+        print(f"[Pipeline] Queue depths: {pipeline.queue_depths()}")
+        print(f"[Pipeline] Provider limits: {current_limits()}")
+        print(f"[Pipeline] HTTP pool: {pool_stats()}, uploads: {upload_stats()}")
+        print(f"[Pipeline] QA cache: {qa_cache_stats()}, heuristics: {heuristic_stats()}")
+        print(
+            f"[Pipeline] Generation cache: article={article_cache_stats()}, "
+            f"image={image_cache_stats()}"
+        )
+
+
+async def reconcile(pipeline: StagedPipeline, owner: str, in_flight: Set[int]) -> int:
+    """
+    Медленная сверка: захватывает все незавершённые элементы (draft и ready),
+    которые не пришли событием (Redis недоступен, событие потеряно) или упали
+    на любой стадии, в том числе с истёкшим lease упавшего процесса.
+    Чекпоинты стадий возвращают элемент ровно на упавшую стадию.
+    """
+
+    # Упавшие в этом же проходе элементы освобождаются и снова доступны —
+    # keyset по id не возвращает к уже пройденным, второй круг не нужен
+    claimed = 0
+    last_id: Optional[int] = None
+    while True:
+        ids = await claim_content_items(owner=owner, limit=CLAIM_BATCH_SIZE, after_id=last_id)
+        if not ids:
+            break
+        claimed += len(ids)
+        last_id = ids[-1]
+
+        # Вся пачка в in_flight до первого submit: submit может ждать,
+        # а событие по элементу из этой пачки не должно запустить его снова
+        in_flight.update(ids)
+
+        # submit ждёт при полной очереди — backpressure до самой БД
+        for content_id in ids:
+            await pipeline.submit(content_id)
 
-            # 4. Публикация в Telegram
-            await publish_telegram_task(content_id)
+    return claimed
 
-            # 5. Публикация в VK
-            await publish_vk_task(content_id)
 
+async def consume_events(pipeline: StagedPipeline, owner: str, in_flight: Set[int]) -> None:
+    """
+    Основной путь: новые draft элементы приходят событием из app.main.add_content
+    и попадают в конвейер через секунды после создания.
+    """
+
+    while True:
+        try:
+            async for content_id in consume_content_created(
+                group=EVENTS_GROUP, consumer=owner, block_ms=EVENTS_BLOCK_MS
+            ):
+                if content_id in in_flight:
+                    continue
+                # Только свободный элемент (без lease или с истёкшим):
+                # захваченный этим же планировщиком второй раз не берём
+                if not await claim_content_item(content_id, owner=owner, status="draft"):
+                    continue
+                in_flight.add(content_id)
+                await pipeline.submit(content_id)
+
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            print(f"[Pipeline] Error content_id={content_id}: {e}")
+            print(f"[Scheduler] Event consumer error: {e}, retrying in {EVENTS_RETRY_SECONDS}s")
+            await asyncio.sleep(EVENTS_RETRY_SECONDS)
 
 
 async def scheduler_loop():
-    while True:
-        print(f"[Scheduler] Running pipeline at {datetime.now()}")
-        await run_pipeline()
-        await asyncio.sleep(INTERVAL_MINUTES * 60)
+    owner = default_lease_owner()
+    in_flight: Set[int] = set()
+
+    async def release(content_id: int, ok: bool) -> None:
+        # Неудачные элементы остаются draft / ready и будут захвачены следующей
+        # сверкой — пока не исчерпают попытки и не получат статус error
+        in_flight.discard(content_id)
+        if ok:
+            await release_content_item(content_id, owner=owner)
+        elif await release_failed_content_item(content_id, owner=owner):
+            print(f"[Scheduler] content_id={content_id} failed too many times, status=error")
+
+    async def renew(content_id: int, stage: str) -> bool:
+        # Долгий элемент не должен потерять lease между стадиями
+        return await renew_content_item_lease(content_id, owner)
+
+    await start_http_session()
+    pipeline = StagedPipeline(on_item_done=release, before_stage=renew)
+    pipeline.start()
+    monitor = asyncio.create_task(_monitor(pipeline))
+    events = asyncio.create_task(consume_events(pipeline, owner, in_flight))
+
+    try:
+        while True:
+            print(f"[Scheduler] Reconciliation at {datetime.now()}")
+            started = time.monotonic()
+            processed_before = pipeline.processed
+            failed_before = pipeline.failed
+
+            claimed = await reconcile(pipeline, owner, in_flight)
+            await asyncio.sleep(INTERVAL_MINUTES * 60)
+
+            elapsed = time.monotonic() - started
+            processed = pipeline.processed - processed_before
+            rate = processed / elapsed * 60 if elapsed > 0 else 0.0
+            print(
+                f"[Pipeline] Tick: {claimed} claimed by reconciliation, {processed} ok, "
+                f"{pipeline.failed - failed_before} failed, {rate:.1f} items/min, "
+                f"queues={pipeline.queue_depths()}"
+            )
+    finally:
+        events.cancel()
+        monitor.cancel()
+        await pipeline.stop()
+        await close_bot()
+        await close_http_session()
 
 
 if __name__ == "__main__":
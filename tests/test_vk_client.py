@@ -0,0 +1,264 @@
+import os
+import re
+import json
+import asyncio
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple
+
+# До импорта модулей приложения: без Redis и без файла БД
+os.environ.setdefault("RATE_LIMIT_BACKEND", "memory")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.core import http_client
+from app.core.adaptive_limiter import ProviderOverloaded
+from app.core.vk_client import VK_EXECUTE_LIMIT, VKClient, VKError
+from app.db.content_item_checkpoint import STAGE_ARTICLE, with_stage_checkpoint
+import worker.tasks_publish_vk as tasks_publish_vk
+
+
+# =========================
+# Фейковый VK API
+# =========================
+
+# Номер вызова (параметр "n") -> ошибка VK, которую вернёт execute
+FAILING_CALLS = {
+    3: {"error_code": 100, "error_msg": "One of the parameters specified was missing or invalid"},
+    27: {"error_code": 6, "error_msg": "Too many requests per second"},
+}
+
+
+def _parse_execute_code(code: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    "return [API.a.b({...}),API.c.d({...})];" -> [("a.b", {...}), ("c.d", {...})]
+    """
+
+    decoder = json.JSONDecoder()
+    calls = []
+    for match in re.finditer(r"API\.([\w.]+)\(", code):
+        params, _ = decoder.raw_decode(code, match.end())
+        calls.append((match.group(1), params))
+    return calls
+
+
+class FakeVK:
+    """
+    VK API (/method/<name>), upload-сервер (/upload) и изображения
+    провайдера (/images/<name>). Запоминает все запросы к API.
+    """
+
+    def __init__(self):
+        self.api_requests: List[str] = []
+        self.uploads = 0
+        self.photos = 0
+        self.wall_posts: List[Dict[str, Any]] = []
+
+        self.app = web.Application()
+        self.app.router.add_post("/method/{method}", self.method)
+        self.app.router.add_post("/upload", self.upload)
+        self.app.router.add_get("/images/{name}", self.image)
+
+    def _call(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == "photos.saveWallPhoto":
+            self.photos += 1
+            return [{"owner_id": -1, "id": self.photos}]
+        if method == "wall.post":
+            self.wall_posts.append(params)
+            return {"post_id": len(self.wall_posts)}
+        if method == "photos.getWallUploadServer":
+            return {"upload_url": str(self.server.make_url("/upload"))}
+
+        n = int(params["n"])
+        if n in FAILING_CALLS:
+            raise LookupError(n)
+        return n
+
+    async def method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.api_requests.append(method)
+
+        if method != "execute":
+            return web.json_response({"response": self._call(method, params)})
+
+        response, errors = [], []
+        for name, call_params in _parse_execute_code(params["code"]):
+            try:
+                response.append(self._call(name, call_params))
+            except LookupError as e:
+                response.append(False)
+                errors.append({"method": name, **FAILING_CALLS[e.args[0]]})
+
+        data: Dict[str, Any] = {"response": response}
+        if errors:
+            data["execute_errors"] = errors
+        return web.json_response(data)
+
+    async def upload(self, request: web.Request) -> web.Response:
+        reader = await request.multipart()
+        part = await reader.next()
+        assert part.name == "photo"
+        assert await part.read()
+
+        self.uploads += 1
+        return web.json_response({"server": 1, "photo": f"[{self.uploads}]", "hash": "h"})
+
+    async def image(self, request: web.Request) -> web.Response:
+        return web.Response(body=b"\x89PNG" + os.urandom(2048), content_type="image/png")
+
+    async def __aenter__(self) -> "FakeVK":
+        self.server = TestServer(self.app)
+        await self.server.start_server()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await http_client.close_http_session()
+        await self.server.close()
+
+    def client(self) -> VKClient:
+        return VKClient(access_token="token", api_url=str(self.server.make_url("/method")))
+
+
+# =========================
+# VKClient.execute
+# =========================
+
+def test_execute_chunks_calls_and_maps_errors():
+    async def scenario():
+        async with FakeVK() as fake:
+            vk = fake.client()
+            calls = [("users.get", {"n": n}) for n in range(30)]
+
+            results = await vk.execute(calls)
+
+            return fake, vk, results
+
+    fake, vk, results = asyncio.run(scenario())
+
+    # 30 вызовов -> 2 запроса execute (25 + 5)
+    assert fake.api_requests == ["execute", "execute"]
+    assert VK_EXECUTE_LIMIT == 25
+    assert vk.stats() == {"requests": 2, "calls": 30}
+
+    # false внутри execute сопоставлен своей ошибке из execute_errors
+    assert len(results) == 30
+    assert isinstance(results[3], VKError)
+    assert results[3].code == 100
+    assert results[3].method == "users.get"
+    assert isinstance(results[27], ProviderOverloaded)
+
+    assert [r for n, r in enumerate(results) if n not in FAILING_CALLS] == [
+        n for n in range(30) if n not in FAILING_CALLS
+    ]
+
+
+# =========================
+# publish_vk_task
+# =========================
+
+class _Session:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def commit(self):
+        pass
+
+
+@pytest.mark.parametrize("image_count", [1, 4, 12])
+def test_publish_vk_task_round_trips(monkeypatch, image_count):
+    checkpoints: List[Dict[str, Any]] = []
+
+    async def qa_ok(**kwargs):
+        return {"score": 10}
+
+    async def save_checkpoint(session, content_item_id, stage, output, **fields):
+        checkpoints.append({"stage": stage, "output": output, **fields})
+
+    async def save_error_log(**kwargs):
+        raise AssertionError(f"Unexpected error log: {kwargs}")
+
+    async def scenario():
+        async with FakeVK() as fake:
+            content_item = SimpleNamespace(
+                id=1,
+                title="Заголовок",
+                text="Текст статьи",
+                images=[
+                    str(fake.server.make_url(f"/images/{n}.png")) for n in range(image_count)
+                ],
+                image_blobs=[],
+                vk_posted=False,
+                stage_checkpoints={},
+            )
+            content_item.stage_checkpoints = with_stage_checkpoint(
+                content_item, STAGE_ARTICLE, content_item.text
+            )
+
+            async def get_content_item(session, content_item_id):
+                return content_item
+
+            monkeypatch.setattr(tasks_publish_vk, "_vk_client", fake.client())
+            monkeypatch.setattr(tasks_publish_vk, "async_session_factory", _Session)
+            monkeypatch.setattr(tasks_publish_vk, "get_content_item_by_id", get_content_item)
+            monkeypatch.setattr(tasks_publish_vk, "analyze_article", qa_ok)
+            monkeypatch.setattr(tasks_publish_vk, "analyze_image_generation", qa_ok)
+            monkeypatch.setattr(tasks_publish_vk, "save_stage_checkpoint", save_checkpoint)
+            monkeypatch.setattr(tasks_publish_vk, "save_error_log", save_error_log)
+
+            await tasks_publish_vk.publish_vk_task(1)
+            return fake
+
+    fake = asyncio.run(scenario())
+
+    attached = min(image_count, tasks_publish_vk.VK_MAX_ATTACHMENTS)
+
+    # Один upload-сервер, один execute с saveWallPhoto, один wall.post —
+    # независимо от количества изображений
+    assert fake.api_requests == ["photos.getWallUploadServer", "execute", "wall.post"]
+    assert fake.uploads == attached
+    assert fake.photos == attached
+
+    assert len(fake.wall_posts) == 1
+    assert fake.wall_posts[0]["attachments"] == ",".join(
+        f"photo-1_{n}" for n in range(1, attached + 1)
+    )
+    assert checkpoints == [{"stage": "vk", "output": {"post_id": 1}, "vk_posted": True}]
+
+
+def test_publish_vk_task_refuses_unfinished_article(monkeypatch):
+    # Частичный текст потоковой генерации: text есть, чекпоинта статьи нет
+    content_item = SimpleNamespace(
+        id=1,
+        title="Заголовок",
+        text="Начало статьи, поток оборвался",
+        images=[],
+        image_blobs=[],
+        vk_posted=False,
+        stage_checkpoints={},
+    )
+    errors: List[str] = []
+
+    async def get_content_item(session, content_item_id):
+        return content_item
+
+    async def save_error_log(**kwargs):
+        errors.append(kwargs["error"])
+
+    async def unexpected(*args, **kwargs):
+        raise AssertionError("VK must not be called for an unfinished article")
+
+    monkeypatch.setattr(tasks_publish_vk, "async_session_factory", _Session)
+    monkeypatch.setattr(tasks_publish_vk, "get_content_item_by_id", get_content_item)
+    monkeypatch.setattr(tasks_publish_vk, "analyze_article", unexpected)
+    monkeypatch.setattr(tasks_publish_vk, "_upload_attachments", unexpected)
+    monkeypatch.setattr(tasks_publish_vk, "save_error_log", save_error_log)
+
+    with pytest.raises(RuntimeError, match="not finished"):
+        asyncio.run(tasks_publish_vk.publish_vk_task(1))
+    assert errors == ["Article is not finished, cannot publish"]
@@ -1,14 +1,28 @@
-import asyncio
+import os
 import logging
-from celery import Celery
+from typing import List, Optional
+
+from celery import Celery, chain
+from celery.exceptions import Ignore
+from celery.signals import (
+    worker_init,
+    worker_shutdown,
+    worker_process_init,
+    worker_process_shutdown,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.db.session import async_session_factory
 from app.db.models import ContentItem
+from app.db.content_item_claim import (
+    release_content_item,
+    release_failed_content_item,
+    renew_content_item_lease,
+)
 from worker.tasks_generate_article import generate_article_task
 from worker.tasks_generate_image import generate_image_task
-from worker.tasks_publish_telegram import publish_telegram_task
-from worker.tasks_publish_vk import publish_vk_task
+from worker.tasks_publish import publish_task
+from worker import event_loop
 
 logger = logging.getLogger(__name__)
 
@@ -32,61 +46,201 @@ celery_app.conf.update(
 )
 
 
+# =========================
+# Очереди
+# =========================
+# Генерация (LLM / изображения) — долгие таски, отдельный prefork-воркер.
+# Публикация — короткие IO-таски, воркер с пулом threads: все потоки
+# отправляют корутины в один event loop процесса, поэтому процесс держит
+# много одновременных async-тасок. Быстрый пост в Telegram больше не ждёт
+# за 120-секундной генерацией изображения.
+GENERATION_QUEUE = os.getenv("CELERY_GENERATION_QUEUE", "generation")
+PUBLISHING_QUEUE = os.getenv("CELERY_PUBLISHING_QUEUE", "publishing")
+
+celery_app.conf.update(
+    task_default_queue=GENERATION_QUEUE,
+    task_routes={
+        "generate_article": {"queue": GENERATION_QUEUE},
+        "generate_image": {"queue": GENERATION_QUEUE},
+        "publish": {"queue": PUBLISHING_QUEUE},
+        # Диспетчер chain ничего не генерирует — пусть не ждёт в очереди генерации
+        "full_pipeline": {"queue": PUBLISHING_QUEUE},
+        "release_lease": {"queue": PUBLISHING_QUEUE},
+    },
+)
+
+
+# =========================
+# Жизненный цикл worker-процесса
+# =========================
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    event_loop.start()
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    event_loop.stop()
+
+
+def _runs_in_main_process(worker) -> bool:
+    # threads / solo пулы выполняют таски в главном процессе,
+    # worker_process_init для них не вызывается
+    return "prefork" not in str(getattr(worker, "pool_cls", "prefork")).lower()
+
+
+@worker_init.connect
+def init_worker(sender=None, **kwargs):
+    if _runs_in_main_process(sender):
+        event_loop.start()
+
+
+@worker_shutdown.connect
+def shutdown_worker(sender=None, **kwargs):
+    if _runs_in_main_process(sender):
+        event_loop.stop()
+
+
 # =========================
 # Async runner helper
 # =========================
 def run_async(task_func, *args, **kwargs):
     """
     Обёртка для запуска async функций в Celery sync context.
+
+    Корутина выполняется в долгоживущем loop процесса (worker.event_loop),
+    поэтому соединения БД и HTTP переиспользуются между тасками.
+    """
+    return event_loop.run_coroutine(task_func(*args, **kwargs))
+
+
+def run_stage(task_func, content_item_id: int, lease_owner: Optional[str] = None, **kwargs):
+    """
+    Стадия pipeline под lease: перед запуском lease продлевается.
+    Если lease перехвачен (истёк и элемент взял другой владелец),
+    стадия и остаток chain не выполняются.
     """
-    return asyncio.run(task_func(*args, **kwargs))
+    if lease_owner is not None and not run_async(
+        renew_content_item_lease, content_item_id, lease_owner
+    ):
+        logger.warning(
+            f"[Celery] Lease lost content_item_id={content_item_id} owner={lease_owner}, stopping chain"
+        )
+        raise Ignore()
+    return run_async(task_func, content_item_id, **kwargs)
 
 
 # =========================
-# Celery tasks
+# Retry-политики по стадиям
 # =========================
-@celery_app.task(bind=True, name="generate_article")
-def celery_generate_article(self, content_item_id: int):
-    logger.info(f"[Celery] generate_article content_item_id={content_item_id}")
-    return run_async(generate_article_task, content_item_id)
+def _retry_policy(stage: str, max_retries: int, backoff: int, backoff_max: int) -> dict:
+    """
+    Параметры autoretry для стадии; переопределяются через
+    <STAGE>_MAX_RETRIES / <STAGE>_RETRY_BACKOFF / <STAGE>_RETRY_BACKOFF_MAX.
 
+    Async-таски стадий сохраняют ошибку в error_logs и пробрасывают
+    исключение дальше — на нём и срабатывает autoretry (а в планировщике
+    элемент считается упавшим и освобождается).
+    """
+    prefix = stage.upper()
+    return {
+        "autoretry_for": (Exception,),
+        "max_retries": int(os.getenv(f"{prefix}_MAX_RETRIES", str(max_retries))),
+        "retry_backoff": int(os.getenv(f"{prefix}_RETRY_BACKOFF", str(backoff))),
+        "retry_backoff_max": int(os.getenv(f"{prefix}_RETRY_BACKOFF_MAX", str(backoff_max))),
+        "retry_jitter": True,
+    }
 
-@celery_app.task(bind=True, name="generate_image")
-def celery_generate_image(self, content_item_id: int):
-    logger.info(f"[Celery] generate_image content_item_id={content_item_id}")
-    return run_async(generate_image_task, content_item_id)
 
+# Генерация дорогая — меньше попыток, длинный backoff.
+# Публикация дешёвая, ошибки обычно временные (flood wait, 5xx) — больше попыток.
+GENERATE_ARTICLE_RETRY = _retry_policy("generate_article", max_retries=2, backoff=60, backoff_max=600)
+GENERATE_IMAGE_RETRY = _retry_policy("generate_image", max_retries=3, backoff=60, backoff_max=900)
+PUBLISH_RETRY = _retry_policy("publish", max_retries=5, backoff=15, backoff_max=600)
 
-@celery_app.task(bind=True, name="publish_telegram")
-def celery_publish_telegram(self, content_item_id: int):
-    logger.info(f"[Celery] publish_telegram content_item_id={content_item_id}")
-    return run_async(publish_telegram_task, content_item_id)
 
+# =========================
+# Celery tasks
+# =========================
+@celery_app.task(name="generate_article", **GENERATE_ARTICLE_RETRY)
+def celery_generate_article(content_item_id: int, lease_owner: Optional[str] = None):
+    logger.info(f"[Celery] generate_article content_item_id={content_item_id}")
+    return run_stage(generate_article_task, content_item_id, lease_owner)
 
-@celery_app.task(bind=True, name="publish_vk")
-def celery_publish_vk(self, content_item_id: int):
-    logger.info(f"[Celery] publish_vk content_item_id={content_item_id}")
-    return run_async(publish_vk_task, content_item_id)
+
+@celery_app.task(name="generate_image", **GENERATE_IMAGE_RETRY)
+def celery_generate_image(content_item_id: int, lease_owner: Optional[str] = None):
+    logger.info(f"[Celery] generate_image content_item_id={content_item_id}")
+    return run_stage(generate_image_task, content_item_id, lease_owner)
+
+
+# channels — ручной перезапуск отдельных каналов, например
+# celery_publish.delay(content_item_id, channels=["vk"])
+@celery_app.task(name="publish", **PUBLISH_RETRY)
+def celery_publish(
+    content_item_id: int,
+    lease_owner: Optional[str] = None,
+    channels: Optional[List[str]] = None,
+):
+    logger.info(f"[Celery] publish content_item_id={content_item_id} channels={channels or 'all'}")
+    return run_stage(publish_task, content_item_id, lease_owner, channels=channels)
+
+
+# Errback подключается immutable-подписью (.si) — поэтому вызывается со своими
+# аргументами, а не с (request, exc, traceback) упавшей стадии
+@celery_app.task(name="release_lease")
+def celery_release_lease(
+    content_item_id: int,
+    lease_owner: Optional[str] = None,
+    failed: bool = False,
+):
+    if lease_owner is None:
+        return
+    logger.info(
+        f"[Celery] release_lease content_item_id={content_item_id} owner={lease_owner} failed={failed}"
+    )
+    if not failed:
+        run_async(release_content_item, content_item_id, owner=lease_owner)
+    elif run_async(release_failed_content_item, content_item_id, owner=lease_owner):
+        logger.warning(
+            f"[Celery] content_item_id={content_item_id} failed too many times, status=error"
+        )
 
 
 # =========================
-# Composite pipeline task
+# Composite pipeline
 # =========================
-@celery_app.task(bind=True, name="full_pipeline")
-def celery_full_pipeline(self, content_item_id: int):
+def build_pipeline(content_item_id: int, lease_owner: Optional[str] = None):
     """
-    Полный pipeline: generate_article -> generate_image -> publish_telegram -> publish_vk
+    Полный pipeline как Celery chain:
+    generate_article -> generate_image -> publish -> release_lease
+
+    lease_owner — владелец lease, взятого при запуске: каждая стадия
+    продлевает его, последний шаг или errback (стадия исчерпала ретраи,
+    попытка засчитывается как неудачная) снимает.
+
+    Каждая стадия ретраится сама по себе: сбой VK не перезапускает
+    генерацию статьи и изображений, а повтор publish затрагивает
+    только каналы, которые ещё не опубликованы.
+    Подписи immutable (.si) — результат стадии не передаётся в следующую.
+    """
+    pipeline = chain(
+        celery_generate_article.si(content_item_id, lease_owner=lease_owner),
+        celery_generate_image.si(content_item_id, lease_owner=lease_owner),
+        celery_publish.si(content_item_id, lease_owner=lease_owner),
+        celery_release_lease.si(content_item_id, lease_owner=lease_owner),
+    )
+    # Стадия исчерпала ретраи — засчитываем неудачную попытку
+    pipeline.link_error(
+        celery_release_lease.si(content_item_id, lease_owner=lease_owner, failed=True)
+    )
+    return pipeline
+
+
+@celery_app.task(name="full_pipeline")
+def celery_full_pipeline(content_item_id: int, lease_owner: Optional[str] = None):
+    """
+    Точка входа для ручного запуска: ставит chain стадий в очередь.
     """
     logger.info(f"[Celery] Running full pipeline for content_item_id={content_item_id}")
-
-    try:
-        run_async(generate_article_task, content_item_id)
-        run_async(generate_image_task, content_item_id)
-        run_async(publish_telegram_task, content_item_id)
-        run_async(publish_vk_task, content_item_id)
-        logger.info(f"[Celery] Full pipeline finished for content_item_id={content_item_id}")
-
-    except Exception as e:
-        logger.exception(f"[Celery] Full pipeline failed for content_item_id={content_item_id}: {e}")
-        # Правильный retry без обращения к user_options
-        raise self.retry(exc=e, countdown=60, max_retries=3)
+    build_pipeline(content_item_id, lease_owner=lease_owner).apply_async()
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, List, Optional
+
+from sqlalchemy import text
+
+from app.db.session import engine
+from app.agents.article_agent import close_openai_client
+from app.core.http_client import close_http_session, start_http_session
+from app.core.blob_store import shutdown_process_pool
+from worker.tasks_publish_telegram import close_bot
+
+logger = logging.getLogger(__name__)
+
+
+# =========================
+# Долгоживущий event loop процесса
+# =========================
+#
+# Один loop на worker-процесс крутится в отдельном потоке. Celery-таски
+# отправляют в него корутины через run_coroutine(), поэтому пул соединений
+# async engine и HTTP-клиенты живут между тасками, а не пересоздаются
+# на каждый asyncio.run().
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+_startup_hooks: List[Callable[[], Awaitable[Any]]] = []
+_shutdown_hooks: List[Callable[[], Awaitable[Any]]] = []
+
+
+def on_startup(hook: Callable[[], Awaitable[Any]]) -> Callable[[], Awaitable[Any]]:
+    """
+    Регистрирует корутину прогрева ресурса (выполняется в loop при старте процесса).
+    """
+    _startup_hooks.append(hook)
+    return hook
+
+
+def on_shutdown(hook: Callable[[], Awaitable[Any]]) -> Callable[[], Awaitable[Any]]:
+    """
+    Регистрирует корутину закрытия ресурса (выполняется в loop при остановке процесса).
+    """
+    _shutdown_hooks.append(hook)
+    return hook
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Возвращает loop процесса, запуская его при первом обращении
+    (на случай пулов, для которых worker_process_init не вызывается).
+    """
+
+    global _loop, _thread
+
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(
+                target=_loop.run_forever,
+                name="celery-event-loop",
+                daemon=True,
+            )
+            _thread.start()
+
+    return _loop
+
+
+def run_coroutine(coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """
+    Выполняет корутину в loop процесса и блокирует вызывающий поток до результата.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result(timeout)
+
+
+def start() -> None:
+    """
+    Запуск loop и прогрев ресурсов. Вызывается из worker_process_init.
+    """
+
+    # Пул соединений, унаследованный от родителя через fork, использовать нельзя
+    engine.sync_engine.dispose(close=False)
+
+    run_coroutine(_run_hooks(_startup_hooks, "startup"))
+    logger.info("[EventLoop] Worker event loop started")
+
+
+def stop() -> None:
+    """
+    Закрытие ресурсов и остановка loop. Вызывается из worker_process_shutdown.
+    """
+
+    global _loop, _thread
+
+    if _loop is None or _loop.is_closed():
+        return
+
+    try:
+        run_coroutine(_run_hooks(_shutdown_hooks, "shutdown"), timeout=30)
+    finally:
+        _loop.call_soon_threadsafe(_loop.stop)
+        if _thread is not None:
+            _thread.join(timeout=5)
+        _loop.close()
+        _loop = None
+        _thread = None
+        logger.info("[EventLoop] Worker event loop stopped")
+
+
+async def _run_hooks(hooks: List[Callable[[], Awaitable[Any]]], stage: str) -> None:
+    for hook in hooks:
+        try:
+            await hook()
+        except Exception:
+            logger.exception("[EventLoop] %s hook %s failed", stage, hook.__name__)
+
+
+# =========================
+# Ресурсы
+# =========================
+
+@on_startup
+async def _warm_up_db() -> None:
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+@on_startup
+async def _start_http_pool() -> None:
+    await start_http_session()
+
+
+@on_shutdown
+async def _close_http_pool() -> None:
+    await close_http_session()
+
+
+@on_shutdown
+async def _dispose_db() -> None:
+    await engine.dispose()
+
+
+@on_shutdown
+async def _close_openai_client() -> None:
+    await close_openai_client()
+
+
+@on_shutdown
+async def _shutdown_blob_pool() -> None:
+    await asyncio.to_thread(shutdown_process_pool)
+
+
+@on_shutdown
+async def _close_telegram_bot() -> None:
+    await close_bot()
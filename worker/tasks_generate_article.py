@@ -1,30 +1,95 @@
+import os
+import time
 import asyncio
 import logging
-from typing import Optional
+from contextlib import aclosing
+from typing import List, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.session import async_session_factory
-from app.db.content_item_get import get_content_item_by_id
-from app.db.content_item_update import update_content_item
+from app.db.content_item_update import get_content_item_by_id, update_content_item
+from app.db.content_item_checkpoint import (
+    STAGE_ARTICLE,
+    is_article_done,
+    with_stage_checkpoint,
+)
 from app.db.log_error import save_error_log
 
-from app.agents.article_agent import generate_article
+from app.agents.article_agent import generate_article, generate_article_stream
 from app.agents.qa_agent import analyze_article
+from app.agents.qa_heuristics import check_partial_article
 
 
 logger = logging.getLogger(__name__)
 
+# Потоковая генерация: частичный текст периодически сохраняется в content_item
+ARTICLE_STREAMING = os.getenv("ARTICLE_STREAMING", "true").lower() == "true"
+ARTICLE_STREAM_FLUSH_CHARS = int(os.getenv("ARTICLE_STREAM_FLUSH_CHARS", "500"))
+ARTICLE_STREAM_FLUSH_SECONDS = float(os.getenv("ARTICLE_STREAM_FLUSH_SECONDS", "3"))
+
+
+async def _stream_article(session: AsyncSession, content_item) -> str:
+    """
+    Генерирует статью потоком.
+
+    Каждые ARTICLE_STREAM_FLUSH_CHARS символов (или ARTICLE_STREAM_FLUSH_SECONDS)
+    частичный текст сохраняется в content_item.text — при таймауте он не теряется —
+    и проверяется дешёвыми структурными проверками. Если текст явно пошёл не туда,
+    поток обрывается, не дожидаясь конца генерации.
+    Чекпоинт стадии ставит только вызывающий код, после полного текста.
+    """
+
+    parts: List[str] = []
+    flushed_length = 0
+    flushed_at = time.monotonic()
+    length = 0
+
+    async with aclosing(generate_article_stream(
+        title=content_item.title,
+        description=content_item.body or "",
+    )) as stream:
+        async for delta in stream:
+            parts.append(delta)
+            length += len(delta)
+
+            if (
+                length - flushed_length < ARTICLE_STREAM_FLUSH_CHARS
+                and time.monotonic() - flushed_at < ARTICLE_STREAM_FLUSH_SECONDS
+            ):
+                continue
+
+            partial = "".join(parts)
+            problem = check_partial_article(partial)
+            if problem:
+                raise RuntimeError(f"Article stream aborted: {problem}")
+
+            await update_content_item(
+                session=session,
+                content_item_id=content_item.id,
+                text=partial,
+            )
+            flushed_length = length
+            flushed_at = time.monotonic()
+
+    article_text = "".join(parts).strip()
+
+    problem = check_partial_article(article_text)
+    if problem:
+        raise RuntimeError(f"Article stream aborted: {problem}")
+
+    return article_text
+
 
 async def generate_article_task(content_item_id: int) -> None:
     """
     Асинхронная таска генерации статьи.
 
     Логика:
-    1. Получаем content_item
-    2. Генерируем статью
+    1. Получаем content_item (если чекпоинт статьи есть — выходим)
+    2. Генерируем статью (в потоковом режиме — с промежуточным сохранением)
     3. Прогоняем через QA
-    4. Обновляем content_item
+    4. Обновляем content_item и ставим чекпоинт стадии
     5. При ошибке — сохраняем лог в error_logs
 
     Никакой бизнес-логики в DB-слое.
@@ -50,12 +115,23 @@ async def generate_article_task(content_item_id: int) -> None:
                 await session.commit()
                 return
 
+            # --- Чекпоинт: статья уже сгенерирована (retry / повторный запуск) ---
+            if is_article_done(content_item):
+                logger.info(
+                    "Article stage already done, skipping (content_item_id=%s)",
+                    content_item_id,
+                )
+                return
+
             # --- Генерация статьи ---
-            article_text = await generate_article(
-                title=content_item.title,
-                brief=content_item.brief,
-                keywords=content_item.keywords,
-            )
+            if ARTICLE_STREAMING:
+                article_text = await _stream_article(session, content_item)
+            else:
+                article = await generate_article(
+                    title=content_item.title,
+                    description=content_item.body or "",
+                )
+                article_text = article.get("text")
 
             if not article_text:
                 raise RuntimeError("Article generation returned empty result")
@@ -74,6 +150,9 @@ async def generate_article_task(content_item_id: int) -> None:
                 status="ready",
                 qa_score=qa_result.get("score"),
                 qa_comment=qa_result.get("comment"),
+                stage_checkpoints=with_stage_checkpoint(
+                    content_item, STAGE_ARTICLE, article_text
+                ),
             )
 
             await session.commit()
@@ -89,12 +168,14 @@ async def generate_article_task(content_item_id: int) -> None:
                 content_item_id,
             )
 
-            # попытка QA-анализа ошибки (если агент поддерживает)
+            # попытка QA-анализа ошибки (если агент поддерживает);
+            # текст ошибки — не статья, структурный pre-filter не нужен
             qa_error: Optional[dict] = None
             try:
                 qa_error = await analyze_article(
                     title="Error during article generation",
                     article_text=str(e),
+                    prefilter=False,
                 )
             except Exception:
                 qa_error = None
@@ -111,3 +192,5 @@ async def generate_article_task(content_item_id: int) -> None:
 
             await session.rollback()
             await session.commit()
+
+            raise
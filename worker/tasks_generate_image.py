@@ -1,28 +1,41 @@
+import os
 import logging
 from typing import Optional, List
 
 from app.db.session import async_session_factory
-from app.db.content_item_get import get_content_item_by_id
-from app.db.content_item_update import update_content_item
+from app.db.content_item_update import get_content_item_by_id, update_content_item
+from app.db.content_item_checkpoint import (
+    STAGE_IMAGES,
+    is_article_done,
+    is_stage_done,
+    stage_hash,
+    with_stage_checkpoint,
+)
 from app.db.log_error import save_error_log
 
 from app.agents.image_agent import generate_images
+from app.core.blob_store import store_images
 from app.agents.qa_agent import analyze_image_generation
 
 
 logger = logging.getLogger(__name__)
 
+# Сколько изображений достаточно, чтобы стадия считалась успешной
+# (ограничено сверху запрошенным image_count)
+IMAGE_MIN_COUNT = int(os.getenv("IMAGE_MIN_COUNT", "1"))
+
 
 async def generate_image_task(content_item_id: int) -> None:
     """
     Асинхронная таска генерации изображений под статью.
 
     Логика:
-    1. Получаем content_item
-    2. Генерируем изображения
+    1. Получаем content_item (если чекпоинт по текущему тексту есть — выходим)
+    2. Генерируем изображения (частичный результат допустим, если не меньше IMAGE_MIN_COUNT)
     3. QA-проверка результата
-    4. Сохраняем ссылки на изображения
-    5. Логируем ошибки при сбоях
+    4. Скачиваем изображения в blob store (оригинал + варианты под площадки)
+    5. Сохраняем ссылки, блобы и чекпоинт стадии
+    6. Логируем ошибки при сбоях
     """
 
     async with async_session_factory() as session:
@@ -45,19 +58,44 @@ async def generate_image_task(content_item_id: int) -> None:
                 await session.commit()
                 return
 
-            if not content_item.text:
-                raise RuntimeError("Article text is empty, cannot generate images")
+            # Частичный текст прерванной потоковой генерации — не статья
+            if not is_article_done(content_item):
+                raise RuntimeError("Article is not finished, cannot generate images")
+
+            # --- Чекпоинт: изображения уже сгенерированы по этому тексту ---
+            article_hash = stage_hash(content_item.text)
+            if content_item.images and is_stage_done(
+                content_item, STAGE_IMAGES, input_hash=article_hash
+            ):
+                logger.info(
+                    "Image stage already done, skipping (content_item_id=%s)",
+                    content_item_id,
+                )
+                return
 
             # --- Генерация изображений ---
+            requested = content_item.image_count or 1
             images: List[str] = await generate_images(
                 title=content_item.title,
                 article_text=content_item.text,
                 style=content_item.image_style,
-                count=content_item.image_count or 1,
+                count=requested,
             )
 
-            if not images:
-                raise RuntimeError("Image generation returned empty list")
+            required = min(IMAGE_MIN_COUNT, requested)
+            if len(images) < max(required, 1):
+                raise RuntimeError(
+                    f"Image generation returned {len(images)} of {requested} images "
+                    f"(minimum {required})"
+                )
+
+            if len(images) < requested:
+                logger.warning(
+                    "Partial image generation, continuing (content_item_id=%s, %s of %s)",
+                    content_item_id,
+                    len(images),
+                    requested,
+                )
 
             # --- QA-проверка ---
             qa_result: Optional[dict] = await analyze_image_generation(
@@ -65,14 +103,22 @@ async def generate_image_task(content_item_id: int) -> None:
                 images=images,
             )
 
+            # --- Локальные копии и варианты под площадки ---
+            # Ссылки провайдера истекают; издатели загружают из хранилища
+            image_blobs = await store_images(images)
+
             # --- Обновление контента ---
             await update_content_item(
                 session=session,
                 content_item_id=content_item_id,
                 images=images,
+                image_blobs=image_blobs,
                 image_status="ready",
                 image_qa_score=(qa_result or {}).get("score"),
                 image_qa_comment=(qa_result or {}).get("comment"),
+                stage_checkpoints=with_stage_checkpoint(
+                    content_item, STAGE_IMAGES, images, input_hash=article_hash
+                ),
             )
 
             await session.commit()
@@ -111,3 +157,5 @@ async def generate_image_task(content_item_id: int) -> None:
 
             await session.rollback()
             await session.commit()
+
+            raise
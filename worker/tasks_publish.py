@@ -0,0 +1,201 @@
+import os
+import asyncio
+import logging
+import importlib
+from typing import Awaitable, Callable, Collection, Dict, List, Optional
+
+from app.db.session import async_session_factory
+from app.db.content_item_update import get_content_item_by_id, update_content_item
+from app.db.content_item_checkpoint import is_stage_done
+from app.db.project_get import get_project_by_id
+
+from worker.tasks_publish_telegram import publish_telegram_task
+from worker.tasks_publish_vk import publish_vk_task
+
+
+logger = logging.getLogger(__name__)
+
+# Конечный статус: опубликовано во все включённые каналы,
+# планировщик элемент больше не захватывает
+PUBLISHED_STATUS = "published"
+
+# Модули с дополнительными каналами: "myapp.channels.dzen,myapp.channels.ok".
+# Модуль при импорте вызывает register_channel(...)
+PUBLISH_PLUGINS = os.getenv("PUBLISH_PLUGINS", "")
+
+
+# =========================
+# Реестр каналов
+# =========================
+class PublishChannel:
+    """
+    Канал публикации.
+
+    - publish(content_item_id) — async-издатель; сам пропускает уже
+      опубликованное и сам отмечает успех (posted_field + чекпоинт)
+    - project_flag — колонка Project, включающая канал (enable_<name>);
+      если у модели Project такой колонки нет, канал включён
+    - posted_field — колонка ContentItem с отметкой публикации;
+      опубликованным канал считается и по чекпоинту стадии <name>
+    """
+
+    def __init__(
+        self,
+        name: str,
+        publish: Callable[[int], Awaitable[None]],
+        project_flag: Optional[str] = None,
+        posted_field: Optional[str] = None,
+    ):
+        self.name = name
+        self.publish = publish
+        self.project_flag = project_flag or f"enable_{name}"
+        self.posted_field = posted_field or f"{name}_posted"
+
+    def is_enabled(self, project) -> bool:
+        if project is None:
+            return True
+        return bool(getattr(project, self.project_flag, True))
+
+    def is_posted(self, content_item) -> bool:
+        return bool(getattr(content_item, self.posted_field, False)) or is_stage_done(
+            content_item, self.name
+        )
+
+
+_channels: Dict[str, PublishChannel] = {}
+_plugins_loaded = False
+
+
+def register_channel(channel: PublishChannel) -> PublishChannel:
+    """
+    Регистрирует канал. Новый канал — плагин: издатель + register_channel,
+    без новой Celery-таски и стадии планировщика.
+    """
+    _channels[channel.name] = channel
+    return channel
+
+
+def registered_channels() -> List[PublishChannel]:
+    _load_plugins()
+    return list(_channels.values())
+
+
+def _load_plugins() -> None:
+    global _plugins_loaded
+    if _plugins_loaded:
+        return
+
+    _plugins_loaded = True
+    for module in PUBLISH_PLUGINS.split(","):
+        module = module.strip()
+        if not module:
+            continue
+        try:
+            importlib.import_module(module)
+        except Exception:
+            logger.exception("Failed to load publish plugin %s", module)
+
+
+register_channel(PublishChannel("telegram", publish_telegram_task))
+register_channel(PublishChannel("vk", publish_vk_task))
+
+
+class ChannelsPublishError(RuntimeError):
+    """
+    Часть каналов не опубликована. Повтор стадии опубликует только их:
+    успешные каналы уже отмечены в *_posted.
+    """
+
+    def __init__(self, errors: Dict[str, BaseException]):
+        self.errors = errors
+        details = "; ".join(f"{name}: {error}" for name, error in errors.items())
+        super().__init__(f"Publishing failed for {sorted(errors)}: {details}")
+
+
+# =========================
+# Async task
+# =========================
+async def publish_task(
+    content_item_id: int,
+    channels: Optional[Collection[str]] = None,
+) -> None:
+    """
+    Публикует элемент во все включённые в проекте каналы одновременно.
+
+    channels — ограничить публикацию этими каналами (ручной перезапуск
+    одного канала); флаги проекта при этом всё равно действуют.
+
+    Логика:
+    1. Один раз читаем content_item и его Project
+    2. Отбираем каналы: включены в проекте и ещё не опубликованы
+    3. Запускаем издателей параллельно; каждый сам отмечает *_posted
+       и пишет свои ошибки в лог
+    4. Если какие-то каналы упали — ChannelsPublishError (ретрай стадии
+       затронет только их); иначе, когда не осталось неопубликованных
+       включённых каналов, элемент получает статус published
+    """
+
+    if channels is not None:
+        unknown = set(channels) - {channel.name for channel in registered_channels()}
+        if unknown:
+            raise ValueError(f"Unknown publish channels: {sorted(unknown)}")
+
+    async with async_session_factory() as session:
+        content_item = await get_content_item_by_id(
+            session=session, content_item_id=content_item_id
+        )
+        if not content_item:
+            logger.warning("Content item %s not found, nothing to publish", content_item_id)
+            return
+
+        project = await get_project_by_id(session, content_item.project_id)
+
+        pending = [
+            channel
+            for channel in registered_channels()
+            if channel.is_enabled(project) and not channel.is_posted(content_item)
+        ]
+
+    # Каналы вне фильтра остаются неопубликованными — элемент ещё не завершён
+    remaining = [
+        channel for channel in pending
+        if channels is not None and channel.name not in channels
+    ]
+    pending = [channel for channel in pending if channel not in remaining]
+
+    if not pending:
+        logger.info("Content item %s: no channels left to publish", content_item_id)
+        if not remaining:
+            await _mark_published(content_item_id)
+        return
+
+    results = await asyncio.gather(
+        *(channel.publish(content_item_id) for channel in pending),
+        return_exceptions=True,
+    )
+
+    errors = {
+        channel.name: result
+        for channel, result in zip(pending, results)
+        if isinstance(result, BaseException)
+    }
+    if errors:
+        raise ChannelsPublishError(errors)
+
+    if not remaining:
+        await _mark_published(content_item_id)
+
+    logger.info(
+        "Content item %s published to %s",
+        content_item_id,
+        ", ".join(channel.name for channel in pending),
+    )
+
+
+async def _mark_published(content_item_id: int) -> None:
+    async with async_session_factory() as session:
+        await update_content_item(
+            session=session,
+            content_item_id=content_item_id,
+            status=PUBLISHED_STATUS,
+        )
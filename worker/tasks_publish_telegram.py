@@ -1,12 +1,30 @@
+import os
+import html
+import asyncio
 import logging
-from typing import Optional, List
+from contextlib import ExitStack
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Optional, List, Tuple, Union
 
 from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import InputFile, InputMediaPhoto, Message
 
 from app.db.session import async_session_factory
-from app.db.content_item_get import get_content_item_by_id
+from app.db.content_item_update import get_content_item_by_id
+from app.db.content_item_checkpoint import (
+    STAGE_TELEGRAM,
+    is_article_done,
+    get_stage_progress,
+    is_stage_done,
+    save_stage_checkpoint,
+    save_stage_progress,
+    stage_hash,
+)
 from app.db.log_error import save_error_log
 from app.agents.qa_agent import analyze_article, analyze_image_generation
+from app.core.adaptive_limiter import ProviderOverloaded, provider_call
+from app.core.blob_store import open_blob, variant_digest
+from app.core.cache import TieredCache
 
 logger = logging.getLogger(__name__)
 
@@ -14,16 +32,372 @@ logger = logging.getLogger(__name__)
 TELEGRAM_BOT_TOKEN = "YOUR_TELEGRAM_BOT_TOKEN"
 TELEGRAM_CHANNEL_ID = "@your_channel_id"  # или chat_id
 
+# Лимиты Bot API
+TELEGRAM_MESSAGE_LIMIT = 4096
+TELEGRAM_CAPTION_LIMIT = 1024
+TELEGRAM_MEDIA_GROUP_LIMIT = 10
+
+# Flood wait: короткое ожидание переживаем внутри таски, длинное — ретрай Celery
+TELEGRAM_FLOOD_RETRIES = int(os.getenv("TELEGRAM_FLOOD_RETRIES", "3"))
+TELEGRAM_MAX_FLOOD_WAIT = float(os.getenv("TELEGRAM_MAX_FLOOD_WAIT", "60"))
+
+# file_id уже отправленных изображений: Telegram хранит файл у себя,
+# повторная отправка по file_id не загружает его заново.
+# Основное хранилище — content_items.telegram_file_ids; кэш общий
+# для элементов с одинаковыми картинками (ключ — sha256 блоба)
+TELEGRAM_FILE_ID_CACHE_TTL = int(os.getenv("TELEGRAM_FILE_ID_CACHE_TTL", "2592000"))
+TELEGRAM_FILE_ID_CACHE_MAX_ITEMS = int(os.getenv("TELEGRAM_FILE_ID_CACHE_MAX_ITEMS", "5000"))
+
+_file_id_cache = TieredCache(
+    namespace="telegram_file_id",
+    max_items=TELEGRAM_FILE_ID_CACHE_MAX_ITEMS,
+    ttl=TELEGRAM_FILE_ID_CACHE_TTL,
+    redis_max_items=TELEGRAM_FILE_ID_CACHE_MAX_ITEMS * 10,
+)
+
+
+# =========================
+# Bot процесса
+# =========================
+_bot: Optional[Bot] = None
+
+
+def _get_bot() -> Bot:
+    """
+    Один Bot на процесс: его aiohttp-сессия держит соединение
+    с api.telegram.org между публикациями.
+    """
+
+    global _bot
+    if _bot is None:
+        _bot = Bot(token=TELEGRAM_BOT_TOKEN)
+    return _bot
+
+
+async def close_bot() -> None:
+    """
+    Закрывает HTTP-сессию бота (при остановке процесса).
+    """
+
+    global _bot
+    if _bot is not None:
+        await _bot.session.close()
+        _bot = None
+
+
+# =========================
+# Telegram API helper
+# =========================
+async def _telegram_call(method: str, call):
+    """
+    Вызов Bot API через rate limiter и адаптивный лимит провайдера.
+    Flood wait от Telegram сигнализирует AIMD-лимитеру о перегрузке.
+
+    Если Telegram просит подождать не дольше TELEGRAM_MAX_FLOOD_WAIT,
+    ждём вне слота лимитера и повторяем тот же вызов — иначе
+    уже отправленная часть поста ушла бы повторно при ретрае таски.
+    """
+
+    for attempt in range(TELEGRAM_FLOOD_RETRIES + 1):
+        try:
+            async with provider_call("telegram", method):
+                try:
+                    return await call()
+                except TelegramRetryAfter as e:
+                    raise ProviderOverloaded(
+                        f"Telegram flood wait on {method}: retry after {e.retry_after}s"
+                    ) from e
+        except ProviderOverloaded as e:
+            retry_after = getattr(e.__cause__, "retry_after", None)
+            if (
+                retry_after is None
+                or retry_after > TELEGRAM_MAX_FLOOD_WAIT
+                or attempt == TELEGRAM_FLOOD_RETRIES
+            ):
+                raise
+            logger.warning("Telegram flood wait on %s, sleeping %ss", method, retry_after)
+            await asyncio.sleep(retry_after)
+
+
+# =========================
+# Разбиение текста
+# =========================
+def _cut(text: str, limit: int) -> Tuple[str, str]:
+    """
+    Отрезает от text кусок не длиннее limit: по абзацу, затем по строке,
+    предложению или пробелу; слово длиннее limit режется жёстко.
+    """
+
+    text = text.strip()
+    if len(text) <= limit:
+        return text, ""
+
+    window = text[:limit]
+    cut = limit
+    for separator in ("\n\n", "\n", ". ", " "):
+        position = window.rfind(separator)
+        if position > limit // 2:
+            cut = position + len(separator)
+            break
+
+    return text[:cut].rstrip(), text[cut:].lstrip()
+
+
+def _cut_escaped(text: str, limit: int) -> Tuple[str, str]:
+    """
+    Как _cut, но режется исходный текст, а лимит проверяется после
+    HTML-экранирования: разрез не попадает внутрь сущности вроде &amp;.
+    Возвращает (экранированный кусок, неэкранированный остаток).
+    """
+
+    size = limit
+    while True:
+        head, rest = _cut(text, size)
+        escaped = html.escape(head, quote=False)
+        if len(escaped) <= limit or size <= 1:
+            return escaped, rest
+        # Сущности длиннее символов: уменьшаем окно пропорционально
+        size = max(1, min(size - 1, size * limit // len(escaped)))
+
+
+def _split_text(text: str, limit: int) -> List[str]:
+    chunks: List[str] = []
+    rest = text
+    while rest:
+        chunk, rest = _cut_escaped(rest, limit)
+        if chunk:
+            chunks.append(chunk)
+    return chunks
+
+
+def _split_post(title: str, text: str, first_limit: int) -> List[str]:
+    """
+    HTML-части поста: первая (с заголовком) — не длиннее first_limit
+    (подпись к альбому или первое сообщение), остальные — под лимит сообщения.
+    """
+
+    header = f"<b>{html.escape(title, quote=False)}</b>\n\n"
+    head, rest = _cut_escaped(text, first_limit - len(header))
+
+    return [header + head] + _split_text(rest, TELEGRAM_MESSAGE_LIMIT)
+
+
+# =========================
+# Файлы из blob store
+# =========================
+class _MmapInputFile(InputFile):
+    """
+    Загрузка из memoryview над mmap блоба: байты читаются чанками
+    прямо из page cache, без копии файла в памяти процесса.
+    """
+
+    def __init__(self, view: memoryview, filename: str):
+        super().__init__(filename=filename)
+        self.view = view
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        for start in range(0, len(self.view), self.chunk_size):
+            yield bytes(self.view[start:start + self.chunk_size])
+
+
+def _image_key(img_url: str, blob: Optional[Dict[str, Any]]) -> str:
+    """
+    Ключ изображения для кэша file_id: sha256 варианта под Telegram
+    (одинаковые картинки разных элементов совпадают), иначе URL.
+    """
+
+    if blob:
+        digest = (blob.get("variants") or {}).get("telegram") or blob.get("sha256")
+        if digest:
+            return digest
+    return img_url
+
+
+def _photo_source(
+    stack: ExitStack,
+    img_url: str,
+    blobs: Dict[str, Dict[str, Any]],
+) -> Union[str, InputFile]:
+    """
+    Локальный вариант изображения под Telegram, если он есть; иначе — URL провайдера.
+    """
+
+    digest = variant_digest(blobs.get(img_url), "telegram")
+    if digest is None:
+        return img_url
+
+    view = stack.enter_context(open_blob(digest))
+    return _MmapInputFile(view, filename=f"{digest[:16]}.jpg")
+
+
+# =========================
+# Кэш file_id
+# =========================
+async def _cached_file_id(key: str, file_ids: Dict[str, str]) -> Optional[str]:
+    file_id = file_ids.get(key)
+    if file_id is None:
+        file_id = await _file_id_cache.get(key)
+        if file_id is not None:
+            file_ids[key] = file_id
+    return file_id
+
+
+async def _remember_file_ids(
+    keys: List[str],
+    messages: List[Message],
+    file_ids: Dict[str, str],
+) -> None:
+    for key, message in zip(keys, messages):
+        if message.photo:
+            # Последний размер — самый большой, его и переиспользуем
+            file_ids[key] = message.photo[-1].file_id
+            await _file_id_cache.set(key, file_ids[key])
+
+
+# =========================
+# Отправка поста
+# =========================
+async def _send_photos(
+    bot: Bot,
+    group: List[str],
+    caption: Optional[str],
+    blobs: Dict[str, Dict[str, Any]],
+    file_ids: Dict[str, str],
+    use_cached: bool = True,
+) -> None:
+    """
+    Одно фото — sendPhoto, несколько — sendMediaGroup; подпись к первому.
+
+    Для уже отправленных изображений передаётся file_id — Telegram
+    не скачивает и не принимает файл повторно. Если file_id отвергнут
+    (другой бот, файл удалён) — один повтор с загрузкой файлов.
+    """
+
+    keys = [_image_key(img_url, blobs.get(img_url)) for img_url in group]
+
+    with ExitStack() as stack:
+        sources: List[Union[str, InputFile]] = []
+        used_cached = False
+        for img_url, key in zip(group, keys):
+            file_id = await _cached_file_id(key, file_ids) if use_cached else None
+            if file_id is not None:
+                used_cached = True
+                sources.append(file_id)
+            else:
+                sources.append(_photo_source(stack, img_url, blobs))
+
+        try:
+            if len(sources) == 1:
+                message = await _telegram_call("sendPhoto", lambda: bot.send_photo(
+                    chat_id=TELEGRAM_CHANNEL_ID,
+                    photo=sources[0],
+                    caption=caption,
+                    parse_mode="HTML",
+                ))
+                messages = [message]
+            else:
+                media = [
+                    InputMediaPhoto(
+                        media=source,
+                        caption=caption if index == 0 else None,
+                        parse_mode="HTML",
+                    )
+                    for index, source in enumerate(sources)
+                ]
+                messages = await _telegram_call("sendMediaGroup", lambda: bot.send_media_group(
+                    chat_id=TELEGRAM_CHANNEL_ID,
+                    media=media,
+                ))
+        except TelegramBadRequest:
+            if not used_cached:
+                raise
+            logger.warning("Telegram rejected cached file_id, re-uploading images")
+            for key in keys:
+                file_ids.pop(key, None)
+                await _file_id_cache.delete(key)
+            return await _send_photos(bot, group, caption, blobs, file_ids, use_cached=False)
+
+    await _remember_file_ids(keys, messages, file_ids)
+
+
+async def _send_post(
+    bot: Bot,
+    title: str,
+    text: str,
+    images: List[str],
+    blobs: Dict[str, Dict[str, Any]],
+    file_ids: Dict[str, str],
+    sent: Optional[List[str]] = None,
+    on_sent: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> int:
+    """
+    Отправляет пост минимальным числом вызовов Bot API:
+    - с изображениями — альбом (sendMediaGroup, до 10 фото), подпись
+      к первому фото; одно фото — sendPhoto с подписью
+    - текст, не поместившийся в подпись (1024), — следующими сообщениями
+      по 4096 символов
+    file_ids (ключ изображения -> Telegram file_id) дополняется на месте.
+
+    Каждый вызов — шаг ("photos:<start>", "text:<index>"): шаги из sent
+    пропускаются, после успешной отправки вызывается on_sent(step).
+    Возвращает количество вызовов.
+    """
+
+    done = set(sent or [])
+    calls = 0
+
+    async def step_sent(step: str) -> None:
+        nonlocal calls
+        calls += 1
+        if on_sent is not None:
+            await on_sent(step)
+
+    first_limit = TELEGRAM_CAPTION_LIMIT if images else TELEGRAM_MESSAGE_LIMIT
+    parts = _split_post(title, text, first_limit)
+
+    if images:
+        caption, parts = parts[0], parts[1:]
+
+        for start in range(0, len(images), TELEGRAM_MEDIA_GROUP_LIMIT):
+            step = f"photos:{start}"
+            if step in done:
+                continue
+            await _send_photos(
+                bot,
+                images[start:start + TELEGRAM_MEDIA_GROUP_LIMIT],
+                caption if start == 0 else None,
+                blobs,
+                file_ids,
+            )
+            await step_sent(step)
+
+    for index, part in enumerate(parts):
+        step = f"text:{index}"
+        if step in done:
+            continue
+        await _telegram_call("sendMessage", lambda: bot.send_message(
+            chat_id=TELEGRAM_CHANNEL_ID,
+            text=part,
+            parse_mode="HTML",
+        ))
+        await step_sent(step)
+
+    return calls
+
 
 # =========================
 # Async task
 # =========================
 async def publish_telegram_task(content_item_id: int) -> None:
     """
-    Публикует статью + изображения в Telegram канал.
+    Публикует статью + изображения в Telegram канал одним альбомом
+    (плюс продолжение текста, если он не поместился в подпись).
+
+    Отправленные части отмечаются в прогрессе стадии: ретрай после
+    сбоя на середине поста досылает только недостающие.
     """
 
-    bot = Bot(token=TELEGRAM_BOT_TOKEN)
+    bot = _get_bot()
 
     async with async_session_factory() as session:
         try:
@@ -45,8 +419,17 @@ async def publish_telegram_task(content_item_id: int) -> None:
                 await session.commit()
                 return
 
-            if not content_item.text:
-                raise RuntimeError("Article text is empty, cannot publish")
+            # Уже опубликовано (retry / повторный запуск) — второй пост не нужен
+            if content_item.telegram_posted or is_stage_done(content_item, STAGE_TELEGRAM):
+                logger.info(
+                    "Content item %s already published to Telegram, skipping",
+                    content_item_id,
+                )
+                return
+
+            # Частичный текст прерванной потоковой генерации не публикуем
+            if not is_article_done(content_item):
+                raise RuntimeError("Article is not finished, cannot publish")
 
             # 2. QA проверки перед публикацией
             qa_article = await analyze_article(
@@ -69,25 +452,63 @@ async def publish_telegram_task(content_item_id: int) -> None:
                         f"Images failed QA (score={qa_images['score']})"
                     )
 
-            # 3. Публикуем текст
-            await bot.send_message(
-                chat_id=TELEGRAM_CHANNEL_ID,
-                text=f"<b>{content_item.title}</b>\n\n{content_item.text}",
-                parse_mode="HTML",
+            # 3. Публикуем альбом с подписью и продолжение текста
+            blobs = {
+                blob["url"]: blob for blob in (content_item.image_blobs or [])
+            }
+            file_ids = dict(content_item.telegram_file_ids or {})
+
+            # Прогресс привязан к содержимому поста: после правки текста
+            # или изображений части считаются заново
+            post_hash = stage_hash({
+                "title": content_item.title,
+                "text": content_item.text,
+                "images": content_item.images,
+            })
+            sent = get_stage_progress(content_item, STAGE_TELEGRAM, post_hash)
+            if sent:
+                logger.info(
+                    "Content item %s: resuming Telegram post, already sent %s",
+                    content_item_id,
+                    sent,
+                )
+
+            async def mark_sent(step: str) -> None:
+                sent.append(step)
+                await save_stage_progress(
+                    session,
+                    content_item_id,
+                    STAGE_TELEGRAM,
+                    post_hash,
+                    sent,
+                    telegram_file_ids=dict(file_ids),
+                )
+
+            calls = await _send_post(
+                bot,
+                title=content_item.title,
+                text=content_item.text,
+                images=content_item.images or [],
+                blobs=blobs,
+                file_ids=file_ids,
+                sent=sent,
+                on_sent=mark_sent,
             )
 
-            # 4. Публикуем изображения (по одному)
-            if content_item.images:
-                for img_url in content_item.images:
-                    await bot.send_photo(
-                        chat_id=TELEGRAM_CHANNEL_ID,
-                        photo=img_url,
-                        caption=content_item.title,
-                    )
+            # 4. Отмечаем публикацию — повторные запуски её пропустят
+            await save_stage_checkpoint(
+                session,
+                content_item_id,
+                STAGE_TELEGRAM,
+                {"text": content_item.text, "images": content_item.images},
+                telegram_posted=True,
+                telegram_file_ids=file_ids,
+            )
 
             logger.info(
-                "Content item %s published to Telegram",
+                "Content item %s published to Telegram (%s API calls)",
                 content_item_id,
+                calls,
             )
 
         except Exception as e:
@@ -107,3 +528,5 @@ async def publish_telegram_task(content_item_id: int) -> None:
                 recommendation="Check Telegram bot token, channel, content quality",
             )
             await session.commit()
+
+            raise
@@ -1,12 +1,23 @@
+import asyncio
 import logging
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 
 import aiohttp
 
 from app.db.session import async_session_factory
-from app.db.content_item_get import get_content_item_by_id
+from app.db.content_item_update import get_content_item_by_id
+from app.db.content_item_checkpoint import (
+    STAGE_VK,
+    is_article_done,
+    is_stage_done,
+    save_stage_checkpoint,
+)
 from app.db.log_error import save_error_log
 from app.agents.qa_agent import analyze_article, analyze_image_generation
+from app.core.http_client import get_http_session
+from app.core.vk_client import VKClient
+from app.core.blob_store import variant_digest
+from app.core.streaming_upload import upload_blob, upload_from_url
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +26,98 @@ logger = logging.getLogger(__name__)
 # =========================
 VK_ACCESS_TOKEN = "YOUR_VK_ACCESS_TOKEN"
 VK_GROUP_ID = "YOUR_VK_GROUP_ID"  # числовой ID группы, без минуса
+# Максимум вложений в одном посте на стене
+VK_MAX_ATTACHMENTS = 10
+
+
+# =========================
+# VK API client
+# =========================
+_vk_client: Optional[VKClient] = None
+
+
+def _get_vk_client() -> VKClient:
+    """
+    Клиент VK API процесса (URL API — VK_API_URL из app.core.vk_client).
+    """
+
+    global _vk_client
+    if _vk_client is None:
+        _vk_client = VKClient(access_token=VK_ACCESS_TOKEN)
+    return _vk_client
+
+
+# =========================
+# Загрузка фото на upload-сервер
+# =========================
+async def _upload_photo(
+    session_http: aiohttp.ClientSession,
+    upload_url: str,
+    img_url: str,
+    blob: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    Отправляет изображение multipart-полем "photo" потоком, чанками
+    UPLOAD_CHUNK_SIZE — изображение целиком в память не читается.
+
+    Источник — вариант под VK из blob store (через mmap); если локальной
+    копии нет, тело ответа провайдера перекачивается прямо в запрос.
+    """
+
+    digest = variant_digest(blob, "vk")
+    if digest is not None:
+        return await upload_blob(
+            session_http, upload_url, "photo", digest, filename=f"{digest[:16]}.jpg"
+        )
+
+    return await upload_from_url(
+        session_http, upload_url, "photo", img_url, filename="image.png"
+    )
+
+
+async def _upload_attachments(
+    session_http: aiohttp.ClientSession,
+    vk: VKClient,
+    images: List[str],
+    image_blobs: List[Dict[str, Any]],
+) -> List[str]:
+    """
+    Загружает все изображения поста параллельно и сохраняет их
+    одним execute (photos.saveWallPhoto на каждое фото).
+
+    Upload-сервер запрашивается один раз; порядок вложений
+    совпадает с порядком изображений. Не больше VK_MAX_ATTACHMENTS.
+    """
+
+    images = images[:VK_MAX_ATTACHMENTS]
+    if not images:
+        return []
+
+    upload_server = await vk.call("photos.getWallUploadServer", {"group_id": VK_GROUP_ID})
+    upload_url = upload_server["upload_url"]
+
+    blobs = {blob["url"]: blob for blob in image_blobs}
+    uploads = await asyncio.gather(*(
+        _upload_photo(session_http, upload_url, img_url, blobs.get(img_url))
+        for img_url in images
+    ))
+
+    saved = await vk.execute([
+        ("photos.saveWallPhoto", {
+            "group_id": VK_GROUP_ID,
+            "server": upload_data["server"],
+            "photo": upload_data["photo"],
+            "hash": upload_data["hash"],
+        })
+        for upload_data in uploads
+    ])
+
+    attachments: List[str] = []
+    for result in saved:
+        if isinstance(result, Exception):
+            raise result
+        attachments.append(f"photo{result[0]['owner_id']}_{result[0]['id']}")
+    return attachments
 
 
 # =========================
@@ -22,7 +125,8 @@ VK_GROUP_ID = "YOUR_VK_GROUP_ID"  # числовой ID группы, без м
 # =========================
 async def publish_vk_task(content_item_id: int) -> None:
     """
-    Публикует статью + изображения в VK группу.
+    Публикует статью + изображения в VK группу одним постом:
+    фото загружаются параллельно, затем wall.post со всеми вложениями.
     """
 
     async with async_session_factory() as session:
@@ -46,8 +150,17 @@ async def publish_vk_task(content_item_id: int) -> None:
                 await session.commit()
                 return
 
-            if not content_item.text:
-                raise RuntimeError("Article text is empty, cannot publish")
+            # Уже опубликовано (retry / повторный запуск) — второй пост не нужен
+            if content_item.vk_posted or is_stage_done(content_item, STAGE_VK):
+                logger.info(
+                    "Content item %s already published to VK, skipping",
+                    content_item_id,
+                )
+                return
+
+            # Частичный текст прерванной потоковой генерации не публикуем
+            if not is_article_done(content_item):
+                raise RuntimeError("Article is not finished, cannot publish")
 
             # 2. QA проверки перед публикацией
             qa_article = await analyze_article(
@@ -70,93 +183,35 @@ async def publish_vk_task(content_item_id: int) -> None:
                         f"Images failed QA (score={qa_images['score']})"
                     )
 
-            # 3. Публикация текста
-            post_payload = {
+            session_http = get_http_session()
+            vk = _get_vk_client()
+
+            # 3. Фото: параллельная загрузка (один upload-сервер на пост),
+            #    сохранение всех фото одним execute
+            attachments = await _upload_attachments(
+                session_http,
+                vk,
+                content_item.images or [],
+                content_item.image_blobs or [],
+            )
+
+            # 4. Один wall.post с текстом и всеми вложениями
+            post = await vk.call("wall.post", {
                 "owner_id": f"-{VK_GROUP_ID}",
                 "from_group": 1,
                 "message": f"{content_item.title}\n\n{content_item.text}",
-                "access_token": VK_ACCESS_TOKEN,
-                "v": "5.131",
-            }
-
-            async with aiohttp.ClientSession() as session_http:
-                async with session_http.post(
-                    "https://api.vk.com/method/wall.post",
-                    params=post_payload,
-                ) as resp:
-                    resp_data = await resp.json()
-                    if "error" in resp_data:
-                        raise RuntimeError(
-                            f"VK wall.post error: {resp_data['error']}"
-                        )
-
-                    post_id = resp_data["response"]["post_id"]
-
-            # 4. Публикация изображений (если есть)
-            if content_item.images:
-                async with aiohttp.ClientSession() as session_http:
-                    for img_url in content_item.images:
-                        # Получаем upload_url
-                        params = {
-                            "group_id": VK_GROUP_ID,
-                            "access_token": VK_ACCESS_TOKEN,
-                            "v": "5.131",
-                        }
-                        async with session_http.get(
-                            "https://api.vk.com/method/photos.getWallUploadServer",
-                            params=params,
-                        ) as resp:
-                            upload_resp = await resp.json()
-                            if "error" in upload_resp:
-                                raise RuntimeError(
-                                    f"VK upload server error: {upload_resp['error']}"
-                                )
-                            upload_url = upload_resp["response"]["upload_url"]
-
-                        # Загружаем фото на сервер VK
-                        async with session_http.post(
-                            upload_url, data={"photo": img_url}
-                        ) as upload_result:
-                            upload_data = await upload_result.json()
-
-                        # Сохраняем фото на стене
-                        save_params = {
-                            "group_id": VK_GROUP_ID,
-                            "server": upload_data["server"],
-                            "photo": upload_data["photo"],
-                            "hash": upload_data["hash"],
-                            "access_token": VK_ACCESS_TOKEN,
-                            "v": "5.131",
-                        }
-                        async with session_http.post(
-                            "https://api.vk.com/method/photos.saveWallPhoto",
-                            params=save_params,
-                        ) as save_resp:
-                            save_data = await save_resp.json()
-                            if "error" in save_data:
-                                raise RuntimeError(
-                                    f"VK saveWallPhoto error: {save_data['error']}"
-                                )
-
-                        photo_id = save_data["response"][0]["id"]
-
-                        # Привязываем к посту
-                        attach_params = {
-                            "owner_id": f"-{VK_GROUP_ID}",
-                            "post_id": post_id,
-                            "attachments": f"photo-{VK_GROUP_ID}_{photo_id}",
-                            "access_token": VK_ACCESS_TOKEN,
-                            "v": "5.131",
-                        }
-                        async with session_http.post(
-                            "https://api.vk.com/method/wall.edit",
-                            params=attach_params,
-                        ) as edit_resp:
-                            edit_data = await edit_resp.json()
-                            if "error" in edit_data:
-                                raise RuntimeError(
-                                    f"VK wall.edit error: {edit_data['error']}"
-                                )
+                "attachments": ",".join(attachments),
+            })
+            post_id = post["post_id"]
+
+            # 5. Отмечаем публикацию — повторные запуски её пропустят
+            await save_stage_checkpoint(
+                session,
+                content_item_id,
+                STAGE_VK,
+                {"post_id": post_id},
+                vk_posted=True,
+            )
 
             logger.info(
                 "Content item %s published to VK", content_item_id
@@ -177,3 +232,5 @@ async def publish_vk_task(content_item_id: int) -> None:
                 recommendation="Check VK token, group ID, content quality",
             )
             await session.commit()
+
+            raise